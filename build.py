@@ -3,29 +3,144 @@
 Build script for PPG Processor using UV instead of setuptools
 """
 
+import atexit
+import glob
+import hashlib
 import os
 import platform
 import sys
 import subprocess
 import shutil
+import tarfile
+import threading
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Have uv byte-compile packages during its (parallel) install so PyInstaller
+# does not pay the compile cost serially while analyzing imports
+os.environ.setdefault("UV_COMPILE_BYTECODE", "1")
+
+# Records the hash of the inputs used for the last build
+BUILD_HASH_FILE = os.path.join("build", "inputs.hash")
+
+# Template of the PyInstaller spec, rendered with the hidden imports and icon
+SPEC_TEMPLATE = "PPG_Processor.spec.tmpl"
+
+# Hidden imports for common packages that might be missed
+HIDDEN_IMPORTS = [
+    'neurokit2',
+    'pandas',
+    'numpy',
+    'pywavelets',
+    'scipy.signal',
+    'scipy.stats',
+    'scipy.interpolate',
+    'scipy.signal._signaltools',
+    'scipy._lib.messagestream',
+    'numpy._core._methods',
+    'pandas._libs.tslibs.base',
+    'pandas._libs.tslibs.np_datetime',
+    'pandas._libs.tslibs.nattype',
+    'pandas._libs.tslibs.timedeltas',
+    'pandas._libs.tslibs.timestamps',
+    'pyqtgraph',
+    'PyQt6.QtCore',
+    'PyQt6.QtWidgets',
+    'PyQt6.QtGui',
+    'PyQt6.QtOpenGL',
+    'PyQt6.QtOpenGLWidgets',
+    'sklearn.utils._cython_blas',
+    'sklearn.neighbors.typedefs',
+    'sklearn.neighbors.quad_tree',
+    'sklearn.tree._utils',
+    # Imported on first use by the GUI
+    'ppg_processor.processing.file_worker',
+    'ppg_processor.processing.directory_worker',
+    'ppg_processor.processing.batch_worker',
+]
+
+# Pinned uv release and its prebuilt archives, keyed by (platform.system(), platform.machine()).
+# Each download is checked against the sha256 published with the release before it is unpacked
+UV_VERSION = "0.6.14"
+UV_RELEASE_URL = f"https://github.com/astral-sh/uv/releases/download/{UV_VERSION}/{{}}"
+UV_ARCHIVES = {
+    ("Linux", "x86_64"): "uv-x86_64-unknown-linux-gnu.tar.gz",
+    ("Linux", "aarch64"): "uv-aarch64-unknown-linux-gnu.tar.gz",
+    ("Darwin", "x86_64"): "uv-x86_64-apple-darwin.tar.gz",
+    ("Darwin", "arm64"): "uv-aarch64-apple-darwin.tar.gz",
+    ("Windows", "AMD64"): "uv-x86_64-pc-windows-msvc.zip",
+    ("Windows", "ARM64"): "uv-aarch64-pc-windows-msvc.zip",
+}
+
+# Where the downloaded uv binary is kept between builds
+UV_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ppg_processor", "uv", UV_VERSION)
+
+
+def verify_sha256(path, url):
+    """Check a downloaded file against the sha256 published next to it at url + '.sha256'"""
+    with urllib.request.urlopen(url + ".sha256") as response:
+        expected = response.read().decode().split()[0].lower()
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+    if digest.hexdigest() != expected:
+        raise OSError(f"Checksum mismatch for {os.path.basename(path)}: expected {expected}, got {digest.hexdigest()}")
+
 
 def ensure_uv_installed():
     """Make sure UV is installed"""
-    try:
-        # Check if uv is already installed
-        subprocess.run(["uv", "--version"], check=True, capture_output=True)
+    uv_name = "uv.exe" if os.name == 'nt' else "uv"
+
+    # Reuse a binary downloaded by a previous build
+    if os.path.exists(os.path.join(UV_CACHE_DIR, uv_name)):
+        os.environ["PATH"] = UV_CACHE_DIR + os.pathsep + os.environ["PATH"]
+
+    if shutil.which("uv"):
         print("UV is already installed.")
-    except (subprocess.SubprocessError, FileNotFoundError):
-        print("UV not found. Installing UV...")
+        return
+
+    print("UV not found. Installing UV...")
+    archive = UV_ARCHIVES.get((platform.system(), platform.machine()))
+    if archive is None:
+        print(f"No prebuilt UV available for {platform.system()} {platform.machine()}.")
+        print("Please install UV manually: https://github.com/astral-sh/uv#installation")
+        sys.exit(1)
+
+    try:
+        # Download the prebuilt binary and unpack it into the cache directory
+        os.makedirs(UV_CACHE_DIR, exist_ok=True)
+        archive_path = os.path.join(UV_CACHE_DIR, archive)
+        archive_url = UV_RELEASE_URL.format(archive)
+        urllib.request.urlretrieve(archive_url, archive_path)
         try:
-            # Install UV using the official installer
-            curl_command = "curl -sSf https://astral.sh/uv/install.sh | sh"
-            subprocess.run(curl_command, shell=True, check=True)
-            print("UV installed successfully.")
-        except subprocess.SubprocessError:
-            print("Failed to install UV automatically.")
-            print("Please install UV manually: https://github.com/astral-sh/uv#installation")
-            sys.exit(1)
+            verify_sha256(archive_path, archive_url)
+        except OSError:
+            os.remove(archive_path)
+            raise
+
+        if archive.endswith(".zip"):
+            with zipfile.ZipFile(archive_path) as zf:
+                member = next(name for name in zf.namelist() if os.path.basename(name) == uv_name)
+                with zf.open(member) as src, open(os.path.join(UV_CACHE_DIR, uv_name), "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+        else:
+            with tarfile.open(archive_path) as tf:
+                member = next(m for m in tf.getmembers() if os.path.basename(m.name) == uv_name)
+                with tf.extractfile(member) as src, open(os.path.join(UV_CACHE_DIR, uv_name), "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+            os.chmod(os.path.join(UV_CACHE_DIR, uv_name), 0o755)
+
+        os.remove(archive_path)
+        os.environ["PATH"] = UV_CACHE_DIR + os.pathsep + os.environ["PATH"]
+        print(f"UV {UV_VERSION} installed successfully in {UV_CACHE_DIR}.")
+    except (OSError, StopIteration, tarfile.TarError, zipfile.BadZipFile) as e:
+        print(f"Failed to install UV automatically: {e}")
+        print("Please install UV manually: https://github.com/astral-sh/uv#installation")
+        sys.exit(1)
 
 
 def ensure_directories():
@@ -48,28 +163,79 @@ def ensure_directories():
     return assets_dir
 
 
-def install_dependencies():
-    """Install dependencies using UV"""
+def check_lockfile():
+    """Verify that uv.lock is up to date with pyproject.toml"""
+    print("Checking that uv.lock matches pyproject.toml...")
+    subprocess.run(["uv", "lock", "--locked"], check=True)
+    print("Lockfile is up to date.")
+
+
+def prewarm_dependencies():
+    """Start downloading and installing the locked third-party dependencies in the background"""
+    print("Prefetching dependencies with UV in the background...")
+    return subprocess.Popen(["uv", "sync", "--frozen", "--no-dev", "--no-install-project"])
+
+
+def install_dependencies(prewarm=None):
+    """Install the locked dependencies from uv.lock using UV"""
+    # Let the background prefetch finish first; any failure resurfaces below
+    if prewarm is not None:
+        prewarm.wait()
+
     print("Installing dependencies with UV...")
-    dependencies = [
-        "PyQt6",
-        "pyqtgraph",
-        "pandas",
-        "numpy",
-        "scipy",
-        "neurokit2",
-        "pywavelets",
-        "pyinstaller"
-    ]
-    
-    # Create a requirements.txt file
-    with open("requirements.txt", "w") as f:
-        for dep in dependencies:
-            f.write(f"{dep}\n")
-    
-    # Install dependencies
-    subprocess.run(["uv", "pip", "install", "-r", "requirements.txt"], check=True)
-    print("Dependencies installed successfully.")
+
+    # Dependencies are declared in pyproject.toml and pinned in uv.lock, so uv
+    # can skip resolution entirely and install the locked set in parallel.
+    # uv sync also creates the .venv virtual environment if it does not exist,
+    # so no separate uv venv process is needed
+    subprocess.run(["uv", "sync", "--frozen", "--no-dev"], check=True)
+    print("Dependencies installed successfully in .venv directory.")
+    print("To activate the environment:")
+    if os.name == 'nt':  # Windows
+        print("    .venv\\Scripts\\activate")
+    else:  # Unix/Linux/Mac
+        print("    source .venv/bin/activate")
+
+
+# Background threads deleting stale directories
+_discard_threads = []
+
+
+def discard_directory(path):
+    """Move a directory out of the way and delete it in a background thread"""
+    stale = f"{path}.old.{os.getpid()}"
+    if os.path.exists(stale):
+        shutil.rmtree(stale, ignore_errors=True)
+    os.rename(path, stale)
+
+    thread = threading.Thread(target=shutil.rmtree, args=(stale,), kwargs={"ignore_errors": True}, daemon=True)
+    thread.start()
+    _discard_threads.append(thread)
+
+
+@atexit.register
+def _finish_discards():
+    """Wait for pending deletions and remove any stale directories left behind"""
+    for thread in _discard_threads:
+        thread.join()
+    for stale in glob.glob("dist.old.*") + glob.glob(os.path.join("build", "*.old.*")):
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def compute_build_hash():
+    """Hash the sources, lockfile and build script that determine the executable"""
+    digest = hashlib.blake2b(digest_size=16)
+
+    inputs = sorted(glob.glob(os.path.join("ppg_processor", "**", "*.py"), recursive=True))
+    inputs += ["pyproject.toml", "uv.lock", SPEC_TEMPLATE, os.path.basename(__file__)]
+
+    for path in inputs:
+        if os.path.exists(path):
+            digest.update(path.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+
+    return digest.hexdigest()
 
 
 def build_executable():
@@ -79,98 +245,67 @@ def build_executable():
     # Create build directory if it doesn't exist
     if not os.path.exists('build'):
         os.makedirs('build')
-    
-    # Clean previous builds
-    if os.path.exists('dist'):
-        shutil.rmtree('dist')
 
+    # Key PyInstaller's work directory on the build inputs so that repeated
+    # builds of unchanged sources reuse the cached analysis
+    build_hash = compute_build_hash()
+    work_path = os.path.join('build', build_hash)
+
+    previous_hash = None
+    if os.path.exists(BUILD_HASH_FILE):
+        with open(BUILD_HASH_FILE, 'r') as file:
+            previous_hash = file.read().strip()
+
+    if build_hash == previous_hash:
+        print("Build inputs unchanged, reusing cached analysis.")
+    elif os.path.exists('dist'):
+        # Clean previous builds
+        discard_directory('dist')
+
+    # Render the spec file from its template
+    render_spec()
+
+    run_pyinstaller(work_path)
+
+    with open(BUILD_HASH_FILE, 'w') as file:
+        file.write(build_hash)
+
+    prune_work_dirs(work_path)
+
+
+def prune_work_dirs(keep):
+    """Delete the PyInstaller work directories of earlier builds, keeping the current one"""
+    for path in glob.glob(os.path.join('build', '*')):
+        if os.path.isdir(path) and os.path.normpath(path) != os.path.normpath(keep) and '.old.' not in path:
+            discard_directory(path)
+
+
+def render_spec():
+    """Write PPG_Processor.spec from PPG_Processor.spec.tmpl"""
     # Set icon path
     icon_path = os.path.abspath('ppg_processor/assets/icon.iconset/icon_512x512.png')
 
-    # MacOS specific options
-    onefile_option = '--onefile'  # Default to onefile for all platforms
-    if platform.system() == 'Darwin':
-        onefile_option = '--onedir'
-
-    # Generate spec file
-    print("Generating PyInstaller spec file...")
-    spec_command = [
-        'pyinstaller',
-        '--name=PPG_Processor',
-        '--windowed',
-        "--clean",
-        f'{onefile_option}',
-        '--collect-submodules=scipy',
-        '--collect-submodules=numpy',
-        '--collect-submodules=pandas',
-        '--collect-submodules=neurokit2',
-        '--collect-submodules=PyQt6',
-        '--collect-submodules=pyqtgraph',
-        f'--icon={icon_path}',
-        'ppg_processor/main.py'
-    ]
-    
-    subprocess.run(spec_command, check=True)
-    
-    # Modify the spec file to include hidden imports and fix issues
-    print("Modifying spec file to include required packages...")
-    with open('PPG_Processor.spec', 'r') as file:
-        spec_content = file.read()
-    
-    # Add hidden imports for common packages that might be missed
-    hidden_imports = [
-        'neurokit2',
-        'pandas',
-        'numpy',
-        'pywavelets',
-        'scipy.signal',
-        'scipy.stats',
-        'scipy.interpolate',
-        'pyqtgraph',
-        'PyQt6.QtCore',
-        'PyQt6.QtWidgets',
-        'PyQt6.QtGui',
-        'PyQt6.QtOpenGL',
-        'PyQt6.QtOpenGLWidgets',
-        'sklearn.utils._cython_blas',
-        'sklearn.neighbors.typedefs',
-        'sklearn.neighbors.quad_tree',
-        'sklearn.tree._utils',
-    ]
-    
-    # Insert hidden imports into the spec file
-    hidden_imports_str = "hiddenimports=" + str(hidden_imports)
-    modified_spec = spec_content.replace(
-        "hiddenimports=[]",
-        hidden_imports_str
-    )
-    
+    with open(SPEC_TEMPLATE, 'r') as file:
+        template = file.read()
+
+    spec_content = template.replace('@HIDDEN@', repr(HIDDEN_IMPORTS)).replace('@ICON@', repr(icon_path))
+
     with open('PPG_Processor.spec', 'w') as file:
-        file.write(modified_spec)
-    
-    # Build the executable
+        file.write(spec_content)
+
+
+def run_pyinstaller(work_path):
+    """Build the executable from PPG_Processor.spec"""
     print("Building executable with PyInstaller...")
-    subprocess.run(['pyinstaller', 'PPG_Processor.spec'], check=True)
-    
+    subprocess.run(
+        ['pyinstaller', f'--workpath={work_path}', '--distpath=dist', '--noconfirm', 'PPG_Processor.spec'],
+        check=True,
+    )
+
     print("\nPackaging complete!")
     print(f"Executable is located at: {os.path.abspath('dist/')}")
 
 
-def create_virtual_environment():
-    """Create a virtual environment using UV"""
-    print("Creating a virtual environment with UV...")
-    
-    # Create a virtual environment in the .venv directory
-    subprocess.run(["uv", "venv"], check=True)
-    
-    print("Virtual environment created successfully in .venv directory.")
-    print("To activate the environment:")
-    if os.name == 'nt':  # Windows
-        print("    .venv\\Scripts\\activate")
-    else:  # Unix/Linux/Mac
-        print("    source .venv/bin/activate")
-
-
 def create_dmg():
     """Create a DMG installer for macOS"""
     print("Creating DMG installer for macOS...")
@@ -198,15 +333,23 @@ def main():
     """Main function to build the application"""
     # Ensure UV is installed
     ensure_uv_installed()
+
+    # Fetch the wheels while the remaining preparation steps run
+    prewarm = prewarm_dependencies()
     
-    # Ensure directories exist
-    ensure_directories()
-    
-    # Create a virtual environment
-    create_virtual_environment()
+    # Prepare the directories and check the lockfile concurrently since
+    # neither depends on the other
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = {
+            executor.submit(step): step.__name__
+            for step in (ensure_directories, check_lockfile)
+        }
+        for future in as_completed(futures):
+            future.result()
+            print(f"Finished {futures[future]}")
     
-    # Install dependencies
-    install_dependencies()
+    # Create the virtual environment and install dependencies
+    install_dependencies(prewarm)
     
     # Build executable
     build_executable()
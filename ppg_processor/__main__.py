@@ -0,0 +1,8 @@
+"""
+Entry point for running the PPG Processor with python -m ppg_processor
+"""
+
+from ppg_processor.main import main
+
+if __name__ == "__main__":
+    main()
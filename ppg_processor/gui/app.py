@@ -3,8 +3,11 @@ Main application window for the PPG Processor
 """
 
 import os
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
 import pandas as pd
-from PyQt6.QtGui import QIcon
 from PyQt6.QtWidgets import (
     QMainWindow,
     QWidget,
@@ -13,7 +16,6 @@ from PyQt6.QtWidgets import (
     QPushButton,
     QLabel,
     QFileDialog,
-    QComboBox,
     QCheckBox,
     QSpinBox,
     QGroupBox,
@@ -25,13 +27,157 @@ from PyQt6.QtWidgets import (
     QRadioButton,
     QTimeEdit,
 )
-from PyQt6.QtCore import QTime
+from PyQt6.QtCore import QTime, QTimer
 
 import pyqtgraph as pg
 
-from ppg_processor.processing.file_worker import PPGProcessingWorker
-from ppg_processor.processing.directory_worker import DirectoryProcessingWorker
-from ppg_processor.processing.batch_worker import BatchWorker
+from ppg_processor.utils.io_utils import write_csv
+
+# Global plot style: white background and no antialiasing for faster redraws
+pg.setConfigOptions(antialias=False, background="w", foreground="k")
+
+
+def _downcast_columns(df, columns):
+    """Return the DataFrame with the given columns (those present) cast to float32"""
+    dtypes = {column: np.float32 for column in columns if column in df.columns}
+    return df.astype(dtypes, copy=False) if dtypes else df
+
+
+def _heart_rate(mean_nn):
+    """Convert a mean NN interval in ms to a heart rate in bpm (NaN if the interval is not positive)"""
+    mean_nn = float(mean_nn)
+    return 60000.0 / mean_nn if mean_nn > 0 else float("nan")
+
+
+# Curve options for long series: the samples are decimated to min/max per pixel
+_CURVE_OPTIONS = dict(autoDownsample=True, downsampleMethod='peak')
+
+
+def _curve_values(values):
+    """Return plot data as one contiguous float32 buffer for pyqtgraph's downsampler"""
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+
+def _ppi_curve_values(ppi_data):
+    """Return the finite PPI values as float32, converting before dropping NaNs to skip a float64 copy"""
+    values = ppi_data['PPI'].to_numpy(dtype=np.float32)
+    return np.ascontiguousarray(values[np.isfinite(values)])
+
+
+def _finite(values):
+    """Whether every value is finite, in which case pyqtgraph can skip its own finite check"""
+    return bool(np.isfinite(values).all())
+
+
+@contextmanager
+def _batched_plot_updates(plot_widget):
+    """Add or update several plot items with a single repaint and auto-range at the end"""
+    view_box = plot_widget.getPlotItem().getViewBox()
+    plot_widget.setUpdatesEnabled(False)
+    view_box.disableAutoRange()
+    try:
+        yield
+    finally:
+        view_box.enableAutoRange()
+        plot_widget.setUpdatesEnabled(True)
+
+
+def _discard_widget(widget):
+    """Delete a results widget, first releasing the plot items (and their data arrays) of its plots"""
+    for plot_widget in widget.findChildren(pg.PlotWidget):
+        plot_widget.clear()
+        plot_widget.close()
+    widget.setParent(None)
+    widget.deleteLater()
+
+
+def _join_lines(lines):
+    """Build a label text from its lines with a single join"""
+    return "\n".join(lines) + "\n"
+
+
+def _ppi_summary_text(ppi_data):
+    """Summary of the detected peaks shown above the PPI plot"""
+    lines = [f"Total peaks detected: {len(ppi_data)}"]
+    if 'PPI' in ppi_data.columns:
+        ppi = ppi_data['PPI'].to_numpy(dtype=np.float64)
+        lines += [
+            f"Average PPI: {np.nanmean(ppi):.2f} ms",
+            f"Min PPI: {np.nanmin(ppi):.2f} ms",
+            f"Max PPI: {np.nanmax(ppi):.2f} ms",
+        ]
+        if 'Quality' in ppi_data.columns:
+            lines.append(f"Average signal quality: {np.nanmean(ppi_data['Quality'].to_numpy(dtype=np.float64)):.2f}")
+    return _join_lines(lines)
+
+
+def _hrv_summary_text(hrv_metrics, overall_metrics):
+    """Summary of the HRV metrics (using overall metrics if available) shown above the HRV plots"""
+    if overall_metrics is not None:
+        lines = [
+            "Overall HRV Metrics:",
+            f"SDNN: {overall_metrics['SDNN']:.2f} ms",
+            f"RMSSD: {overall_metrics['RMSSD']:.2f} ms",
+            f"Mean HR: {_heart_rate(overall_metrics['MeanNN']):.1f} bpm",
+        ]
+        if 'Time_Range' in overall_metrics:
+            lines.append(f"Time Range: {overall_metrics['Time_Range']}")
+    else:
+        lines = [f"Windows analyzed: {len(hrv_metrics)}"]
+        if not hrv_metrics.empty:
+            sdnn, rmssd, mean_nn = np.nanmean(
+                hrv_metrics[['SDNN', 'RMSSD', 'MeanNN']].to_numpy(dtype=np.float32), axis=0
+            )
+            lines += [
+                f"Average SDNN: {sdnn:.2f} ms",
+                f"Average RMSSD: {rmssd:.2f} ms",
+                f"Average HR: {_heart_rate(mean_nn):.1f} bpm",
+            ]
+    return _join_lines(lines)
+
+
+def _tab_layout(result_dict):
+    """Describe which widgets a channel tab needs, so tabs with the same layout can be refreshed in place"""
+    ppi_data = result_dict['ppi_data']
+    hrv_metrics = result_dict['hrv_metrics']
+    has_hrv = hrv_metrics is not None and not hrv_metrics.empty
+    return (
+        'PPI' in ppi_data.columns and len(ppi_data) > 1,
+        'Participant' in ppi_data.columns,
+        has_hrv,
+        has_hrv and 'Participant' in hrv_metrics.columns,
+        has_hrv and len(hrv_metrics) > 1,
+    )
+
+
+class _ChannelTab:
+    """Page of a channel in the results tabs and the widgets that can be updated with new results"""
+
+    def __init__(self, page):
+        self.page = page
+        self.content = None
+        self.layout = None
+        self.summary_label = None
+        self.ppi_item = None
+        self.hrv_summary_label = None
+        self.sdnn_item = None
+        self.rmssd_item = None
+
+    def can_update(self, result_dict):
+        """Whether the built widgets can show the new results without being rebuilt"""
+        if self.content is None or self.layout != _tab_layout(result_dict):
+            return False
+        # Participant summaries and bar plots depend on the participant set, so they are rebuilt
+        has_ppi_plot, ppi_participants, has_hrv, hrv_participants, has_hrv_plot = self.layout
+        if ppi_participants or hrv_participants:
+            return False
+        # Every widget the update touches must have been built for this layout
+        return (
+            self.summary_label is not None
+            and (not has_ppi_plot or self.ppi_item is not None)
+            and (not has_hrv or self.hrv_summary_label is not None)
+            and (not has_hrv_plot or (self.sdnn_item is not None and self.rmssd_item is not None))
+        )
 
 
 class PPGProcessorApp(QMainWindow):
@@ -40,13 +186,19 @@ class PPGProcessorApp(QMainWindow):
     def __init__(self):
         super().__init__()
 
+        # Channel tabs shown in the results, keyed by channel name
+        self._channel_tabs = {}
+
+        # Channel tabs whose contents have not been built yet, keyed by tab page
+        self._pending_tabs = {}
+
+        # Participant comparison sub-tabs whose plot has not been built yet, keyed by tab page
+        self._pending_participant_plots = {}
+
         self.setWindowTitle("PPG to PPI Processor")
         self.setGeometry(100, 100, 1000, 1000)
 
-        # Set window icon
-        icon_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "icon.ico")
-        if os.path.exists(icon_path):
-            self.setWindowIcon(QIcon(icon_path))
+        # The window uses the application icon set in main.py
 
         self.init_ui()
 
@@ -85,8 +237,17 @@ class PPGProcessorApp(QMainWindow):
         self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(0)
 
+        # Coalesce progress and status updates from the workers into at most ~30 repaints per second
+        self._pending_progress = 0
+        self._last_progress = 0
+        self._pending_status = None
+        self._update_timer = QTimer(self)
+        self._update_timer.setInterval(33)
+        self._update_timer.timeout.connect(self._flush_updates)
+
         # Results tabs
         self.results_tabs = QTabWidget()
+        self.results_tabs.currentChanged.connect(self._populate_tab)
 
         # Add components to main layout
         main_layout.addWidget(file_group)
@@ -202,26 +363,35 @@ class PPGProcessorApp(QMainWindow):
         self.channel_p2_check = QCheckBox("P2")
         self.channel_p2_check.setChecked(True)
 
+        # Channel names paired with their checkboxes, in processing order
+        self._channel_checks = (
+            ("P0", self.channel_p0_check),
+            ("P1", self.channel_p1_check),
+            ("P2", self.channel_p2_check),
+        )
+
         channel_layout = QHBoxLayout()
-        channel_layout.addWidget(self.channel_p0_check)
-        channel_layout.addWidget(self.channel_p1_check)
-        channel_layout.addWidget(self.channel_p2_check)
+        for _, check in self._channel_checks:
+            channel_layout.addWidget(check)
         settings_layout.addLayout(channel_layout, 1, 1)
 
-        # Output format selection
-        settings_layout.addWidget(QLabel("Output Format:"), 2, 0)
-        self.output_format_combo = QComboBox()
-        self.output_format_combo.addItem("CSV")
-        settings_layout.addWidget(self.output_format_combo, 2, 1)
-
         # HRV calculation option
         self.calculate_hrv_check = QCheckBox("Calculate HRV Metrics")
         self.calculate_hrv_check.setChecked(True)
-        settings_layout.addWidget(self.calculate_hrv_check, 3, 0, 1, 2)
+        settings_layout.addWidget(self.calculate_hrv_check, 2, 0)
+
+        # Zero-phase (forward-backward) filtering keeps the peak timing exact; the single pass is faster
+        self.zero_phase_check = QCheckBox("Zero-Phase Filtering")
+        self.zero_phase_check.setChecked(True)
+        self.zero_phase_check.setToolTip(
+            "Filter forward and backward so the peaks are not delayed. "
+            "Uncheck for a faster single-pass filter that shifts the peaks slightly later."
+        )
+        settings_layout.addWidget(self.zero_phase_check, 2, 1)
 
         # Add time range UI
         time_range_group = self.init_time_range_ui()
-        settings_layout.addWidget(time_range_group, 4, 0, 1, 2)
+        settings_layout.addWidget(time_range_group, 3, 0, 1, 2)
 
         # PPI threshold settings
         threshold_group = QGroupBox("PPI Thresholds (outlier removal)")
@@ -241,7 +411,7 @@ class PPGProcessorApp(QMainWindow):
         threshold_layout.addWidget(self.ppi_high_threshold_spin, 1, 1)
         threshold_group.setLayout(threshold_layout)
 
-        settings_layout.addWidget(threshold_group, 5, 0, 1, 2)
+        settings_layout.addWidget(threshold_group, 4, 0, 1, 2)
 
         settings_group.setLayout(settings_layout)
         return settings_group
@@ -320,81 +490,72 @@ class PPGProcessorApp(QMainWindow):
     def process_file(self):
         """Process the selected file or directory"""
         # Get selected channels
-        channels = []
-        if self.channel_p0_check.isChecked():
-            channels.append("P0")
-        if self.channel_p1_check.isChecked():
-            channels.append("P1")
-        if self.channel_p2_check.isChecked():
-            channels.append("P2")
+        channels = tuple(channel for channel, check in self._channel_checks if check.isChecked())
 
         if not channels:
             QMessageBox.warning(self, "No Channels", "Please select at least one channel to process.")
             return
 
-        # Clear previous results
+        # Clear previous results (the tabs are kept so they can be refreshed in place)
         self.results = {}
-        self.results_tabs.clear()
 
         # Setup progress tracking
         self.progress_bar.setValue(0)
-
-        # Determine processing mode
-        is_file_mode = self.file_radio.isChecked()
-        is_dir_mode = self.directory_radio.isChecked()
-        is_batch_mode = self.participant_radio.isChecked()
-
-        # Create and start worker thread
-        if is_file_mode and self.current_file:
-            self.worker = PPGProcessingWorker(
-                file_path=self.current_file,
-                window_size=self.window_size_spin.value(),
-                channels=channels,
-                calculate_hrv=self.calculate_hrv_check.isChecked(),
-                ppi_low_threshold=self.ppi_low_threshold_spin.value(),
-                ppi_high_threshold=self.ppi_high_threshold_spin.value(),
-                use_time_range=self.use_time_range_check.isChecked(),
-                start_time=self.start_time_edit.time().toString("HH:mm")
-                if self.use_time_range_check.isChecked()
-                else None,
-                end_time=self.end_time_edit.time().toString("HH:mm") if self.use_time_range_check.isChecked() else None,
-            )
-        elif is_dir_mode and self.current_directory:
-            self.worker = DirectoryProcessingWorker(
-                directory_path=self.current_directory,
-                window_size=self.window_size_spin.value(),
-                channels=channels,
-                calculate_hrv=self.calculate_hrv_check.isChecked(),
-                ppi_low_threshold=self.ppi_low_threshold_spin.value(),
-                ppi_high_threshold=self.ppi_high_threshold_spin.value(),
-                use_time_range=self.use_time_range_check.isChecked(),
-                start_time=self.start_time_edit.time().toString("HH:mm")
-                if self.use_time_range_check.isChecked()
-                else None,
-                end_time=self.end_time_edit.time().toString("HH:mm") if self.use_time_range_check.isChecked() else None,
-            )
-        elif is_batch_mode and self.current_directory:
-            self.worker = BatchWorker(
-                directory_path=self.current_directory,
-                window_size=self.window_size_spin.value(),
-                channels=channels,
-                calculate_hrv=self.calculate_hrv_check.isChecked(),
-                ppi_low_threshold=self.ppi_low_threshold_spin.value(),
-                ppi_high_threshold=self.ppi_high_threshold_spin.value(),
-                use_time_range=self.use_time_range_check.isChecked(),
-                start_time=self.start_time_edit.time().toString("HH:mm")
-                if self.use_time_range_check.isChecked()
-                else None,
-                end_time=self.end_time_edit.time().toString("HH:mm") if self.use_time_range_check.isChecked() else None,
-            )
+        self._pending_progress = 0
+        self._last_progress = 0
+
+        # Determine processing mode and its input path
+        if self.file_radio.isChecked():
+            mode, input_path = "file", self.current_file
+        elif self.directory_radio.isChecked():
+            mode, input_path = "directory", self.current_directory
+        elif self.participant_radio.isChecked():
+            mode, input_path = "batch", self.current_directory
         else:
+            mode, input_path = None, None
+
+        if not input_path:
             QMessageBox.warning(self, "No Input", "Please select a file or directory to process.")
             return
 
+        # Read the settings shared by all workers once
+        use_time_range = self.use_time_range_check.isChecked()
+        common_kwargs = dict(
+            window_size=self.window_size_spin.value(),
+            channels=channels,
+            calculate_hrv=self.calculate_hrv_check.isChecked(),
+            ppi_low_threshold=self.ppi_low_threshold_spin.value(),
+            ppi_high_threshold=self.ppi_high_threshold_spin.value(),
+            use_time_range=use_time_range,
+            start_time=self.start_time_edit.time().toString("HH:mm") if use_time_range else None,
+            end_time=self.end_time_edit.time().toString("HH:mm") if use_time_range else None,
+            zero_phase=self.zero_phase_check.isChecked(),
+        )
+
+        # Create and start worker thread. The workers pull in neurokit2 and scipy, so they are
+        # only imported on first use (with plain import statements that PyInstaller can follow)
+        if mode == "file":
+            from ppg_processor.processing.file_worker import PPGProcessingWorker
+
+            self.worker = PPGProcessingWorker(file_path=input_path, **common_kwargs)
+        elif mode == "directory":
+            from ppg_processor.processing.directory_worker import DirectoryProcessingWorker
+
+            self.worker = DirectoryProcessingWorker(directory_path=input_path, **common_kwargs)
+        else:
+            from ppg_processor.processing.batch_worker import BatchWorker
+
+            self.worker = BatchWorker(directory_path=input_path, **common_kwargs)
+
         self.worker.progress.connect(self.update_progress)
         self.worker.status.connect(self.update_status)
         self.worker.error.connect(self.show_error)
         self.worker.finished_with_result.connect(self.display_results)
+        self.worker.finished.connect(self._stop_update_timer)
+        if mode == "directory":
+            self._folders_done = 0
+            self._ppi_values_done = 0
+            self.worker.folder_finished.connect(self.update_folder_summary)
 
         # Disable UI during processing
         self.process_btn.setEnabled(False)
@@ -403,18 +564,45 @@ class PPGProcessorApp(QMainWindow):
         self.browse_dir_btn.setEnabled(False)
 
         # Start processing
+        self._update_timer.start()
         self.worker.start()
 
     def update_progress(self, value):
-        """Update the progress bar"""
-        self.progress_bar.setValue(value)
+        """Record the latest progress value; the progress bar is repainted by _flush_updates"""
+        self._pending_progress = value
+
+    def _flush_updates(self):
+        """Push the latest progress value and status message to the widgets if they changed"""
+        if self._pending_progress != self._last_progress:
+            self.progress_bar.setValue(self._pending_progress)
+            self._last_progress = self._pending_progress
+
+        if self._pending_status is not None:
+            self.status_bar.showMessage(self._pending_status)
+            self._pending_status = None
+
+    def _stop_update_timer(self):
+        """Stop coalescing worker updates and show the final values"""
+        self._update_timer.stop()
+        self._flush_updates()
+
+    def update_folder_summary(self, folder, ppi_count):
+        """Show a running summary while a directory is being processed"""
+        self._folders_done += 1
+        self._ppi_values_done += ppi_count
+        self.update_status(
+            f"Folder {folder} done - {self._folders_done} folders, {self._ppi_values_done} PPI values so far"
+        )
 
     def update_status(self, message):
-        """Update the status bar with a message"""
-        self.status_bar.showMessage(message)
+        """Record the latest status message; the status bar is repainted by _flush_updates"""
+        self._pending_status = message
 
     def show_error(self, message):
         """Display an error message"""
+        # Some errors are not fatal and the worker carries on, so the updates keep flowing;
+        # the timer is stopped once the worker thread finishes
+        self._flush_updates()
         QMessageBox.critical(self, "Error", message)
         self.process_btn.setEnabled(True)
         self.browse_file_btn.setEnabled(True)
@@ -423,6 +611,7 @@ class PPGProcessorApp(QMainWindow):
     def display_results(self, results):
         """Display the processing results"""
         self.results = results
+        self._stop_update_timer()
         
         # Re-enable UI
         self.process_btn.setEnabled(True)
@@ -431,230 +620,284 @@ class PPGProcessorApp(QMainWindow):
         self.browse_participant_btn.setEnabled(True)
         self.save_btn.setEnabled(True)
         
-        # Display results in tabs
-        self.results_tabs.clear()
+        # Display results in tabs, reusing the tabs of channels that are already shown
+        # and building new channel plots on first activation
+        self._pending_tabs = {}
+        self._pending_participant_plots = {}
+        shown = {channel: result_dict for channel, result_dict in results.items() if not result_dict['ppi_data'].empty}
+
+        # Remove the tabs of channels that are no longer in the results
+        for channel in [channel for channel in self._channel_tabs if channel not in shown]:
+            bundle = self._channel_tabs.pop(channel)
+            self.results_tabs.removeTab(self.results_tabs.indexOf(bundle.page))
+            _discard_widget(bundle.page)
         
-        for channel, result_dict in results.items():
-            ppi_data = result_dict['ppi_data']
-            hrv_metrics = result_dict['hrv_metrics']
-            overall_metrics = result_dict.get('overall_metrics')
-            
-            if ppi_data.empty:
+        for position, (channel, result_dict) in enumerate(shown.items()):
+            bundle = self._channel_tabs.get(channel)
+
+            if bundle is None:
+                # Placeholder that receives the channel's widgets once the tab is shown
+                placeholder = QWidget()
+                placeholder_layout = QVBoxLayout()
+                placeholder_layout.setContentsMargins(0, 0, 0, 0)
+                placeholder.setLayout(placeholder_layout)
+
+                self.results_tabs.insertTab(position, placeholder, channel)
+                bundle = self._channel_tabs[channel] = _ChannelTab(placeholder)
+            elif bundle.can_update(result_dict):
+                self._update_channel_tab(bundle, result_dict)
                 continue
+            elif bundle.content is not None:
+                # The layout changed, so the channel's widgets are rebuilt. A fresh bundle drops
+                # the references to the discarded widgets, which Qt deletes
+                _discard_widget(bundle.content)
+                bundle = self._channel_tabs[channel] = _ChannelTab(bundle.page)
+
+            self._pending_tabs[bundle.page] = (channel, result_dict)
+
+        # Build the tab that is visible by default
+        self._populate_tab(self.results_tabs.currentIndex())
+        
+        self.status_bar.showMessage("Processing complete")
+
+    def _populate_tab(self, index):
+        """Build the contents of a channel tab the first time it is shown"""
+        page = self.results_tabs.widget(index)
+        pending = self._pending_tabs.pop(page, None)
+        if pending is None:
+            return
+
+        channel, result_dict = pending
+        bundle = self._channel_tabs[channel]
+        bundle.content = self._build_channel_tab(channel, result_dict, bundle)
+        bundle.layout = _tab_layout(result_dict)
+        page.layout().addWidget(bundle.content)
+
+    def _update_channel_tab(self, bundle, result_dict):
+        """Show new results in the already built widgets of a channel tab"""
+        ppi_data = result_dict['ppi_data']
+        hrv_metrics = result_dict['hrv_metrics']
+
+        bundle.summary_label.setText(_ppi_summary_text(ppi_data))
+        if bundle.ppi_item is not None:
+            with _batched_plot_updates(bundle.ppi_item.getViewWidget()):
+                bundle.ppi_item.setData(_ppi_curve_values(ppi_data), skipFiniteCheck=True)
+
+        if bundle.hrv_summary_label is not None:
+            bundle.hrv_summary_label.setText(_hrv_summary_text(hrv_metrics, result_dict.get('overall_metrics')))
+        if bundle.sdnn_item is not None:
+            x_values = np.arange(len(hrv_metrics), dtype=np.float32)
+            sdnn_vals = _curve_values(hrv_metrics['SDNN'])
+            rmssd_vals = _curve_values(hrv_metrics['RMSSD'])
+            with _batched_plot_updates(bundle.sdnn_item.getViewWidget()):
+                bundle.sdnn_item.setData(x_values, sdnn_vals, skipFiniteCheck=_finite(sdnn_vals))
+                bundle.rmssd_item.setData(x_values, rmssd_vals, skipFiniteCheck=_finite(rmssd_vals))
+
+    def _build_channel_tab(self, channel, result_dict, bundle):
+        """Create the PPI and HRV sub-tabs for a single channel, keeping the updatable widgets on the bundle"""
+        ppi_data = result_dict['ppi_data']
+        hrv_metrics = result_dict['hrv_metrics']
+        overall_metrics = result_dict.get('overall_metrics')
+        
+        # Create a tab for this channel
+        tab = QTabWidget()  # Use tab widget for PPI and HRV sub-tabs
+        
+        # --- PPI Tab ---
+        ppi_tab = QWidget()
+        ppi_layout = QVBoxLayout()
+        
+        # Add a summary of the PPI results
+        bundle.summary_label = QLabel(_ppi_summary_text(ppi_data))
+        ppi_layout.addWidget(bundle.summary_label)
+        
+        # If this was participant data, add participant information to the summary
+        if 'Participant' in ppi_data.columns:
+            participant_lines = ["", "Participant Information:"]
+            participants = ppi_data['Participant'].unique()
+            participant_lines.append(f"Number of participants: {len(participants)}")
+            participant_lines.append(f"Participants: {', '.join(participants)}")
+            
+            # Add epoch information if available
+            if 'Epoch' in ppi_data.columns:
+                # Count distinct epochs per participant with a hash-based nunique
+                epochs_per_participant = ppi_data.groupby('Participant', sort=False)['Epoch'].nunique()
+                total_epochs = int(epochs_per_participant.sum())
+                participant_lines.append(f"Total epochs: {total_epochs}")
                 
-            # Create a tab for this channel
-            tab = QTabWidget()  # Use tab widget for PPI and HRV sub-tabs
+                # Show epochs per participant (up to 5 participants to avoid cluttering)
+                if len(participants) <= 5:
+                    for participant in participants:
+                        participant_lines.append(f"  {participant}: {epochs_per_participant.get(participant, 0)} epochs")
             
-            # --- PPI Tab ---
-            ppi_tab = QWidget()
-            ppi_layout = QVBoxLayout()
+            participant_label = QLabel(_join_lines(participant_lines))
+            ppi_layout.addWidget(participant_label)
+        
+        # Create a plot of the PPI values if available
+        if 'PPI' in ppi_data.columns and len(ppi_data) > 1:
+            plot_widget = pg.PlotWidget()
+            plot_widget.setTitle(f"PPI Values - {channel}")
+            plot_widget.setLabel('left', 'PPI', units='ms')
+            plot_widget.setLabel('bottom', 'Sample')
             
-            # Add a summary of the PPI results
-            summary_text = f"Total peaks detected: {len(ppi_data)}\n"
-            if 'PPI' in ppi_data.columns:
-                summary_text += f"Average PPI: {ppi_data['PPI'].mean():.2f} ms\n"
-                summary_text += f"Min PPI: {ppi_data['PPI'].min():.2f} ms\n"
-                summary_text += f"Max PPI: {ppi_data['PPI'].max():.2f} ms\n"
-                if 'Quality' in ppi_data.columns:
-                    summary_text += f"Average signal quality: {ppi_data['Quality'].mean():.2f}\n"
+            # Plot PPI values
+            pen = pg.mkPen(color=(76, 114, 176), width=2)
+            ppi_vals = _ppi_curve_values(ppi_data)
+            ppi_item = pg.PlotDataItem(ppi_vals, pen=pen, skipFiniteCheck=True, **_CURVE_OPTIONS)
+            with _batched_plot_updates(plot_widget):
+                plot_widget.addItem(ppi_item)
+            bundle.ppi_item = ppi_item
             
-            summary_label = QLabel(summary_text)
-            ppi_layout.addWidget(summary_label)
+            ppi_layout.addWidget(plot_widget, 1)  # Give stretch factor
+        
+        ppi_tab.setLayout(ppi_layout)
+        tab.addTab(ppi_tab, "PPI Data")
+        
+        # --- HRV Tab ---
+        participant_page = None
+        if hrv_metrics is not None and not hrv_metrics.empty:
+            hrv_tab = QWidget()
+            hrv_layout = QVBoxLayout()
             
-            # If this was participant data, add participant information to the summary
-            if 'Participant' in ppi_data.columns:
-                participant_summary = "\nParticipant Information:\n"
-                participants = ppi_data['Participant'].unique()
-                participant_summary += f"Number of participants: {len(participants)}\n"
-                participant_summary += f"Participants: {', '.join(participants)}\n"
-                
-                # Add epoch information if available
-                if 'Epoch' in ppi_data.columns:
-                    total_epochs = len(ppi_data.groupby(['Participant', 'Epoch']))
-                    participant_summary += f"Total epochs: {total_epochs}\n"
-                    
-                    # Show epochs per participant (up to 5 participants to avoid cluttering)
-                    if len(participants) <= 5:
-                        for participant in participants:
-                            participant_data = ppi_data[ppi_data['Participant'] == participant]
-                            epochs = participant_data['Epoch'].unique()
-                            participant_summary += f"  {participant}: {len(epochs)} epochs\n"
-                
-                participant_label = QLabel(participant_summary)
-                ppi_layout.addWidget(participant_label)
+            # Add HRV metrics summary (using overall metrics if available)
+            bundle.hrv_summary_label = QLabel(_hrv_summary_text(hrv_metrics, overall_metrics))
+            hrv_layout.addWidget(bundle.hrv_summary_label)
             
-            # Create a plot of the PPI values if available
-            if 'PPI' in ppi_data.columns and len(ppi_data) > 1:
-                plot_widget = pg.PlotWidget()
-                plot_widget.setBackground('w')
-                plot_widget.setTitle(f"PPI Values - {channel}")
-                plot_widget.setLabel('left', 'PPI', units='ms')
-                plot_widget.setLabel('bottom', 'Sample')
+            # Add participant HRV information if available
+            if 'Participant' in hrv_metrics.columns:
+                participant_hrv_lines = ["", "Participant HRV Information:"]
                 
-                # Plot PPI values
-                pen = pg.mkPen(color=(76, 114, 176), width=2)
-                plot_widget.plot(ppi_data['PPI'].dropna().values, pen=pen)
+                # Per-participant metrics are only shown for up to 5 participants to avoid
+                # cluttering, so count them before computing anything per participant
+                num_participants = hrv_metrics['Participant'].nunique()
+                show_participants = num_participants <= 5
                 
-                ppi_layout.addWidget(plot_widget, 1)  # Give stretch factor
-            
-            ppi_tab.setLayout(ppi_layout)
-            tab.addTab(ppi_tab, "PPI Data")
-            
-            # --- HRV Tab ---
-            if hrv_metrics is not None and not hrv_metrics.empty:
-                hrv_tab = QWidget()
-                hrv_layout = QVBoxLayout()
-                
-                # Add HRV metrics summary (using overall metrics if available)
-                overall_metrics = result_dict.get('overall_metrics')
-                if overall_metrics is not None:
-                    hrv_summary = "Overall HRV Metrics:\n"
-                    hrv_summary += f"SDNN: {overall_metrics['SDNN']:.2f} ms\n"
-                    hrv_summary += f"RMSSD: {overall_metrics['RMSSD']:.2f} ms\n"
-                    hrv_summary += f"Mean HR: {60000 / overall_metrics['MeanNN']:.1f} bpm\n"
-                    if 'Time_Range' in overall_metrics:
-                        hrv_summary += f"Time Range: {overall_metrics['Time_Range']}\n"
+                if show_participants:
+                    # Calculate the metrics of every participant in a single grouped pass
+                    participant_metrics = hrv_metrics.groupby('Participant', sort=False).agg(
+                        SDNN_mean=('SDNN', 'mean'),
+                        SDNN_std=('SDNN', 'std'),
+                        RMSSD_mean=('RMSSD', 'mean'),
+                        RMSSD_std=('RMSSD', 'std'),
+                        MeanNN_mean=('MeanNN', 'mean'),
+                        Windows=('SDNN', 'size'),
+                    )
+                    
+                    # Display summary of metrics by participant
+                    for participant, metrics in participant_metrics.iterrows():
+                        participant_hrv_lines.append(
+                            f"  {participant} - SDNN: {metrics['SDNN_mean']:.2f} ms, "
+                            f"RMSSD: {metrics['RMSSD_mean']:.2f} ms, "
+                            f"HR: {_heart_rate(metrics['MeanNN_mean']):.1f} bpm"
+                        )
                 else:
-                    hrv_summary = f"Windows analyzed: {len(hrv_metrics)}\n"
-                    if not hrv_metrics.empty:
-                        hrv_summary += f"Average SDNN: {hrv_metrics['SDNN'].mean():.2f} ms\n"
-                        hrv_summary += f"Average RMSSD: {hrv_metrics['RMSSD'].mean():.2f} ms\n"
-                        hrv_summary += f"Average HR: {60000 / hrv_metrics['MeanNN'].mean():.1f} bpm\n"
+                    participant_hrv_lines.append(f"  {num_participants} participants (too many to display individually)")
                 
-                hrv_summary_label = QLabel(hrv_summary)
-                hrv_layout.addWidget(hrv_summary_label)
+                participant_hrv_label = QLabel(_join_lines(participant_hrv_lines))
+                hrv_layout.addWidget(participant_hrv_label)
+            
+            # Create plots for common HRV metrics
+            if len(hrv_metrics) > 1:
+                metrics_plot = pg.PlotWidget()
+                metrics_plot.setTitle(f"HRV Metrics Over Time - {channel}")
+                metrics_plot.setLabel('left', 'Value', units='ms')
+                metrics_plot.setLabel('bottom', 'Window')
                 
-                # Add participant HRV information if available
-                if 'Participant' in hrv_metrics.columns:
-                    participant_hrv_summary = "\nParticipant HRV Information:\n"
-                    participants = hrv_metrics['Participant'].unique()
-                    
-                    # Calculate average metrics per participant
-                    participant_metrics = {}
-                    for participant in participants:
-                        p_data = hrv_metrics[hrv_metrics['Participant'] == participant]
-                        participant_metrics[participant] = {
-                            'SDNN': p_data['SDNN'].mean(),
-                            'RMSSD': p_data['RMSSD'].mean(),
-                            'MeanNN': p_data['MeanNN'].mean()
-                        }
-                    
-                    # Display summary of metrics by participant (up to 5 to avoid cluttering)
-                    if len(participants) <= 5:
-                        for participant, metrics in participant_metrics.items():
-                            participant_hrv_summary += f"  {participant} - SDNN: {metrics['SDNN']:.2f} ms, "
-                            participant_hrv_summary += f"RMSSD: {metrics['RMSSD']:.2f} ms, "
-                            participant_hrv_summary += f"HR: {60000 / metrics['MeanNN']:.1f} bpm\n"
-                    else:
-                        participant_hrv_summary += f"  {len(participants)} participants (too many to display individually)\n"
-                    
-                    participant_hrv_label = QLabel(participant_hrv_summary)
-                    hrv_layout.addWidget(participant_hrv_label)
+                # Window indices for the x-axis
+                x_values = np.arange(len(hrv_metrics), dtype=np.float32)
                 
-                # Create plots for common HRV metrics
-                if len(hrv_metrics) > 1:
-                    metrics_plot = pg.PlotWidget()
-                    metrics_plot.setBackground('w')
-                    metrics_plot.setTitle(f"HRV Metrics Over Time - {channel}")
-                    metrics_plot.setLabel('left', 'Value', units='ms')
-                    metrics_plot.setLabel('bottom', 'Window')
-                    
-                    # Convert timestamps to strings for x-axis
-                    x_values = list(range(len(hrv_metrics)))
-                    
+                sdnn_pen = pg.mkPen(color=(76, 114, 176), width=2)
+                sdnn_vals = _curve_values(hrv_metrics['SDNN'])
+                rmssd_pen = pg.mkPen(color=(214, 39, 40), width=2)
+                rmssd_vals = _curve_values(hrv_metrics['RMSSD'])
+                
+                with _batched_plot_updates(metrics_plot):
                     # Plot SDNN
-                    sdnn_pen = pg.mkPen(color=(76, 114, 176), width=2)
-                    metrics_plot.plot(x_values, hrv_metrics['SDNN'].values, pen=sdnn_pen, name="SDNN")
+                    bundle.sdnn_item = metrics_plot.plot(
+                        x_values, sdnn_vals, pen=sdnn_pen, name="SDNN", skipFiniteCheck=_finite(sdnn_vals), **_CURVE_OPTIONS
+                    )
                     
                     # Plot RMSSD
-                    rmssd_pen = pg.mkPen(color=(214, 39, 40), width=2)
-                    metrics_plot.plot(x_values, hrv_metrics['RMSSD'].values, pen=rmssd_pen, name="RMSSD")
-                    
-                    # Add legend
-                    legend = metrics_plot.addLegend()
-                    
-                    hrv_layout.addWidget(metrics_plot, 1)
-                    
-                    # If participant data is available, also create a participant comparison plot
-                    if 'Participant' in hrv_metrics.columns and len(participants) <= 5:
-                        # Create a new plot that shows data grouped by participant
-                        participant_plot = pg.PlotWidget()
-                        participant_plot.setBackground('w')
-                        participant_plot.setTitle(f"HRV Metrics by Participant - {channel}")
-                        participant_plot.setLabel('left', 'Value', units='ms')
-                        participant_plot.setLabel('bottom', 'Participant')
-                        
-                        # Use different colors for different metrics
-                        colors = [(76, 114, 176), (221, 132, 82), (85, 168, 104), 
-                                (196, 78, 82), (129, 114, 179)]
-                        
-                        # Create grouped bar chart-like visualization
-                        bar_width = 0.2
-                        
-                        for p_idx, participant in enumerate(participants):
-                            p_data = hrv_metrics[hrv_metrics['Participant'] == participant]
-                            
-                            # Plot SDNN bar
-                            sdnn_mean = p_data['SDNN'].mean()
-                            sdnn_bar = pg.BarGraphItem(
-                                x=[p_idx - bar_width], height=[sdnn_mean], width=bar_width,
-                                brush=colors[0 % len(colors)]
-                            )
-                            participant_plot.addItem(sdnn_bar)
-                            
-                            # Plot RMSSD bar
-                            rmssd_mean = p_data['RMSSD'].mean()
-                            rmssd_bar = pg.BarGraphItem(
-                                x=[p_idx], height=[rmssd_mean], width=bar_width,
-                                brush=colors[1 % len(colors)]
-                            )
-                            participant_plot.addItem(rmssd_bar)
-                            
-                            # If enough data points, manually add error bar lines instead of using ErrorBarItem
-                            if len(p_data) > 1:
-                                # For SDNN
-                                sdnn_std = p_data['SDNN'].std()
-                                
-                                # Draw vertical line for SDNN error bar
-                                sdnn_err_line = pg.PlotCurveItem(
-                                    x=[p_idx - bar_width, p_idx - bar_width],
-                                    y=[sdnn_mean - sdnn_std, sdnn_mean + sdnn_std],
-                                    pen=pg.mkPen(color=colors[0 % len(colors)], width=2)
-                                )
-                                participant_plot.addItem(sdnn_err_line)
-                                
-                                # For RMSSD
-                                rmssd_std = p_data['RMSSD'].std()
-                                
-                                # Draw vertical line for RMSSD error bar
-                                rmssd_err_line = pg.PlotCurveItem(
-                                    x=[p_idx, p_idx],
-                                    y=[rmssd_mean - rmssd_std, rmssd_mean + rmssd_std],
-                                    pen=pg.mkPen(color=colors[1 % len(colors)], width=2)
-                                )
-                                participant_plot.addItem(rmssd_err_line)
-                        
-                        # Add legend
-                        legend = participant_plot.addLegend()
-                        # Create proper dummy items for the legend
-                        sdnn_dummy = pg.BarGraphItem(x=[0], height=[1], width=bar_width, brush=colors[0 % len(colors)])
-                        rmssd_dummy = pg.BarGraphItem(x=[0], height=[1], width=bar_width, brush=colors[1 % len(colors)])
-                        legend.addItem(sdnn_dummy, "SDNN")
-                        legend.addItem(rmssd_dummy, "RMSSD")
-                        
-                        # Add participant labels to x-axis
-                        axis = participant_plot.getAxis('bottom')
-                        ticks = [(i, name) for i, name in enumerate(participants)]
-                        axis.setTicks([ticks])
-                        
-                        hrv_layout.addWidget(participant_plot, 1)
+                    bundle.rmssd_item = metrics_plot.plot(
+                        x_values, rmssd_vals, pen=rmssd_pen, name="RMSSD", skipFiniteCheck=_finite(rmssd_vals), **_CURVE_OPTIONS
+                    )
+                
+                # Add legend
+                metrics_plot.addLegend()
+                
+                hrv_layout.addWidget(metrics_plot, 1)
                 
-                hrv_tab.setLayout(hrv_layout)
-                tab.addTab(hrv_tab, "HRV Metrics")
+                # If participant data is available, also add a participant comparison plot in
+                # its own sub-tab, built the first time the sub-tab is shown
+                if 'Participant' in hrv_metrics.columns and show_participants:
+                    participant_page = QWidget()
+                    participant_page_layout = QVBoxLayout()
+                    participant_page.setLayout(participant_page_layout)
+                    self._pending_participant_plots[participant_page] = (channel, participant_metrics)
             
-            self.results_tabs.addTab(tab, channel)
-        
-        self.status_bar.showMessage("Processing complete")
+            hrv_tab.setLayout(hrv_layout)
+            tab.addTab(hrv_tab, "HRV Metrics")
+
+        # --- By Participant Tab ---
+        if participant_page is not None:
+            tab.addTab(participant_page, "By Participant")
+            tab.currentChanged.connect(lambda index, tab=tab: self._populate_participant_tab(tab.widget(index)))
+
+        return tab
+
+    def _populate_participant_tab(self, page):
+        """Build the participant comparison plot the first time its sub-tab is shown"""
+        pending = self._pending_participant_plots.pop(page, None)
+        if pending is None:
+            return
+
+        channel, participant_metrics = pending
+        page.layout().addWidget(self._build_participant_plot(channel, participant_metrics))
+
+    def _build_participant_plot(self, channel, participant_metrics):
+        """Create a bar plot comparing the mean SDNN and RMSSD of each participant"""
+        participants = participant_metrics.index
+
+        # Create a new plot that shows data grouped by participant
+        participant_plot = pg.PlotWidget()
+        participant_plot.setTitle(f"HRV Metrics by Participant - {channel}")
+        participant_plot.setLabel('left', 'Value', units='ms')
+        participant_plot.setLabel('bottom', 'Participant')
+
+        # Use different colors for different metrics
+        colors = [(76, 114, 176), (221, 132, 82), (85, 168, 104), 
+                (196, 78, 82), (129, 114, 179)]
+
+        # Create grouped bar chart-like visualization
+        bar_width = 0.2
+
+        # One bar item and one error bar item per metric, covering all participants
+        x_rmssd = np.arange(len(participants), dtype=np.float32)
+        x_sdnn = x_rmssd - bar_width
+
+        # Error bars are only drawn for participants with more than one window
+        has_spread = participant_metrics['Windows'].to_numpy() > 1
+
+        legend = participant_plot.addLegend()
+        with _batched_plot_updates(participant_plot):
+            for name, x, color in (("SDNN", x_sdnn, colors[0]), ("RMSSD", x_rmssd, colors[1])):
+                means = _curve_values(participant_metrics[f'{name}_mean'])
+                stds = np.where(has_spread, participant_metrics[f'{name}_std'].to_numpy(), 0.0)
+
+                bars = pg.BarGraphItem(x=x, height=means, width=bar_width, brush=color)
+                participant_plot.addItem(bars)
+                legend.addItem(bars, name)
+
+                participant_plot.addItem(pg.ErrorBarItem(
+                    x=x, y=means, height=_curve_values(2 * np.nan_to_num(stds)), beam=0,
+                    pen=pg.mkPen(color=color, width=2)
+                ))
+
+        # Add participant labels to x-axis
+        axis = participant_plot.getAxis('bottom')
+        ticks = [(i, name) for i, name in enumerate(participants)]
+        axis.setTicks([ticks])
+
+        return participant_plot
 
     def save_results(self):
         """Save the processing results"""
@@ -678,79 +921,91 @@ class PPGProcessorApp(QMainWindow):
             base_filename = "ppg_analysis"
 
         try:
+            # Collect every output table first, then write them all in one pass
+            tables = {}
             for channel, result_dict in self.results.items():
-                ppi_data = result_dict["ppi_data"]
-                hrv_metrics = result_dict["hrv_metrics"]
-                overall_metrics = result_dict.get("overall_metrics")
-
-                if ppi_data.empty:
-                    continue
-
-                # Save PPI Data as CSV
-                csv_path = os.path.join(save_dir, f"{base_filename}_{channel}_ppi.csv")
-                ppi_data.to_csv(csv_path, index=False)
-
-                # Save HRV metrics if available (both per-window and overall)
-                if hrv_metrics is not None and not hrv_metrics.empty:
-                    hrv_csv_path = os.path.join(save_dir, f"{base_filename}_{channel}_hrv.csv")
-
-                    # If overall metrics exist, add them as a special row
-                    if overall_metrics is not None:
-                        # Convert overall metrics dict to DataFrame row
-                        overall_df = pd.DataFrame([overall_metrics])
-                        overall_df["Window"] = "Overall"  # Add identifier column
-
-                        # Add window column to hrv_metrics if it doesn't exist
-                        if "Window" not in hrv_metrics.columns:
-                            hrv_metrics["Window"] = [f"Window_{i}" for i in range(len(hrv_metrics))]
-
-                        # Combine per-window and overall metrics
-                        combined_metrics = pd.concat([hrv_metrics, overall_df], ignore_index=True)
-                        combined_metrics.to_csv(hrv_csv_path, index=False)
-                    else:
-                        hrv_metrics.to_csv(hrv_csv_path, index=False)
-
-                # If participant data is available, also save aggregated metrics by participant
-                if (
-                    "Participant" in ppi_data.columns
-                    and hrv_metrics is not None
-                    and "Participant" in hrv_metrics.columns
-                ):
-                    participant_csv_path = os.path.join(save_dir, f"{base_filename}_{channel}_participant_summary.csv")
-
-                    # Create summary dataframe grouped by participant
-                    participant_summaries = []
-
-                    for participant in hrv_metrics["Participant"].unique():
-                        p_data = hrv_metrics[hrv_metrics["Participant"] == participant]
-
-                        # Get number of epochs for this participant
-                        num_epochs = 1
-                        if "Epoch" in ppi_data.columns:
-                            participant_ppi = ppi_data[ppi_data["Participant"] == participant]
-                            num_epochs = len(participant_ppi["Epoch"].unique())
-
-                        # Calculate summary metrics
-                        summary = {
-                            "Participant": participant,
-                            "Epochs": num_epochs,
-                            "Windows": len(p_data),
-                            "SDNN_mean": p_data["SDNN"].mean(),
-                            "SDNN_std": p_data["SDNN"].std(),
-                            "RMSSD_mean": p_data["RMSSD"].mean(),
-                            "RMSSD_std": p_data["RMSSD"].std(),
-                            "MeanNN_mean": p_data["MeanNN"].mean(),
-                            "HR_mean": 60000 / p_data["MeanNN"].mean(),
-                            "DataPoints_mean": p_data["Num_Data_Points"].mean(),
-                        }
-
-                        participant_summaries.append(summary)
-
-                    # Save participant summary
-                    pd.DataFrame(participant_summaries).to_csv(participant_csv_path, index=False)
+                tables.update(self._channel_output_tables(channel, result_dict, save_dir, base_filename))
+
+            # Overlap the file writes on a small pool
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [executor.submit(write_csv, table, path) for path, table in tables.items()]
+                wait(futures)
+
+            # Surface the first failure, if any
+            for future in futures:
+                future.result()
 
             QMessageBox.information(self, "Success", f"Results saved to {save_dir}")
             self.status_bar.showMessage(f"Results saved to {save_dir}")
 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save results: {str(e)}")
+
+    def _channel_output_tables(self, channel, result_dict, save_dir, base_filename):
+        """Build the PPI, HRV and participant summary tables of a single channel, keyed by output path"""
+        ppi_data = result_dict["ppi_data"]
+        hrv_metrics = result_dict["hrv_metrics"]
+        overall_metrics = result_dict.get("overall_metrics")
+        tables = {}
+
+        if ppi_data.empty:
+            return tables
+
+        # Save PPI Data (float32 is plenty for millisecond PPIs and quality scores)
+        ppi_path = os.path.join(save_dir, f"{base_filename}_{channel}_ppi.csv")
+        tables[ppi_path] = _downcast_columns(ppi_data, ("PPI", "Quality"))
+
+        # Save HRV metrics if available (both per-window and overall)
+        if hrv_metrics is not None and not hrv_metrics.empty:
+            hrv_path = os.path.join(save_dir, f"{base_filename}_{channel}_hrv.csv")
+
+            # If overall metrics exist, add them as a special row
+            if overall_metrics is not None:
+                # Convert overall metrics dict to DataFrame row
+                overall_df = pd.DataFrame([overall_metrics])
+                overall_df["Window"] = "Overall"  # Add identifier column
+
+                # Add window column to hrv_metrics if it doesn't exist
+                if "Window" not in hrv_metrics.columns:
+                    hrv_metrics["Window"] = [f"Window_{i}" for i in range(len(hrv_metrics))]
+
+                # Combine per-window and overall metrics
+                combined_metrics = pd.concat([hrv_metrics, overall_df], ignore_index=True)
+                tables[hrv_path] = combined_metrics
+            else:
+                tables[hrv_path] = hrv_metrics
+
+        # If participant data is available, also save aggregated metrics by participant
+        if (
+            "Participant" in ppi_data.columns
+            and hrv_metrics is not None
+            and "Participant" in hrv_metrics.columns
+        ):
+            participant_path = os.path.join(save_dir, f"{base_filename}_{channel}_participant_summary.csv")
+
+            # Create summary dataframe grouped by participant in a single aggregation
+            summary = hrv_metrics.groupby("Participant", sort=False).agg(
+                Windows=("SDNN", "size"),
+                SDNN_mean=("SDNN", "mean"),
+                SDNN_std=("SDNN", "std"),
+                RMSSD_mean=("RMSSD", "mean"),
+                RMSSD_std=("RMSSD", "std"),
+                MeanNN_mean=("MeanNN", "mean"),
+                DataPoints_mean=("Num_Data_Points", "mean"),
+            )
+            summary["HR_mean"] = 60000 / summary["MeanNN_mean"]
+
+            # Get number of epochs for each participant
+            if "Epoch" in ppi_data.columns:
+                epochs = ppi_data.groupby("Participant", sort=False)["Epoch"].nunique()
+                summary.insert(0, "Epochs", epochs.reindex(summary.index, fill_value=0))
+            else:
+                summary.insert(0, "Epochs", 1)
+
+            # Save participant summary
+            summary = summary[
+                ["Epochs", "Windows", "SDNN_mean", "SDNN_std", "RMSSD_mean", "RMSSD_std", "MeanNN_mean", "HR_mean", "DataPoints_mean"]
+            ]
+            tables[participant_path] = summary.reset_index()
+
+        return tables
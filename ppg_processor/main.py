@@ -3,13 +3,17 @@
 PPG Processor - A tool for processing PPG data and calculating PPI and HRV metrics
 """
 
+import multiprocessing
 import os
 import sys
-from PyQt6.QtGui import QIcon
-from PyQt6.QtWidgets import QApplication
-from ppg_processor.gui.app import PPGProcessorApp
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QIcon, QPixmap
+from PyQt6.QtWidgets import QApplication, QSplashScreen
 
 def main():
+    # Let frozen executables start the folder-processing worker processes
+    multiprocessing.freeze_support()
+
     app = QApplication(sys.argv)
     
     # Set app style
@@ -20,9 +24,17 @@ def main():
     icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "icon-512-maskable.png")
     if os.path.exists(icon_path):
         app.setWindowIcon(QIcon(icon_path))
-    
+
+    # Paint a splash screen before importing the GUI, which pulls in pandas and pyqtgraph
+    splash = QSplashScreen(QPixmap(icon_path).scaled(256, 256, Qt.AspectRatioMode.KeepAspectRatio))
+    splash.show()
+    app.processEvents()
+
+    from ppg_processor.gui.app import PPGProcessorApp
+
     window = PPGProcessorApp()
     window.show()
+    splash.finish(window)
     
     sys.exit(app.exec())
 
@@ -1,8 +1,12 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtCore import QMutex, QMutexLocker, QRunnable, QThread, QThreadPool, pyqtSignal
 
-from ppg_processor.processing.directory_worker import DirectoryProcessingWorker
+from ppg_processor.processing.directory_worker import _MP_CONTEXT, DirectoryProcessingWorker, _SignalThrottle
+from ppg_processor.processing.hrv_metrics import overall_hrv_metrics
+from ppg_processor.utils.io_utils import concat_sorted, iter_subfolders
 
 
 class BatchWorker(QThread):
@@ -41,6 +45,7 @@ class BatchWorker(QThread):
         use_time_range=False,
         start_time=None,
         end_time=None,
+        zero_phase=True,
     ):
         super().__init__()
         self.directory_path = directory_path
@@ -52,25 +57,33 @@ class BatchWorker(QThread):
         self.use_time_range = use_time_range
         self.start_time = start_time
         self.end_time = end_time
+        self.zero_phase = zero_phase
 
         # Initialize flags to track processing state
         self.is_running = False
         self.should_stop = False
 
+        # Directory workers of the participants being processed, guarded by the results mutex
+        self._results_mutex = QMutex()
+        self._active_workers = set()
+
+        # Process pool that runs the session folders of all participants while processing
+        self._executor = None
+
     def run(self):
         """Process all participant folders and their sessions"""
         try:
             self.is_running = True
             self.should_stop = False
 
-            # Find all participant folders in the directory
-            participant_folders = [f.path for f in os.scandir(self.directory_path) if f.is_dir()]
+            # Count the participant folders first so the total is reported right away
+            total_participants = sum(1 for _ in iter_subfolders(self.directory_path))
 
-            if not participant_folders:
+            if not total_participants:
                 self.error.emit(f"No participant folders found in {self.directory_path}")
                 return
 
-            self.status.emit(f"Found {len(participant_folders)} participant folders to process")
+            self.status.emit(f"Found {total_participants} participant folders to process")
 
             # Initialize results dictionary
             results = {}
@@ -80,37 +93,54 @@ class BatchWorker(QThread):
                     "hrv_metrics": pd.DataFrame() if self.calculate_hrv else None,
                 }
 
-            # Process each participant folder
-            for i, participant_folder in enumerate(participant_folders):
-                if self.should_stop:
-                    self.status.emit("Processing stopped by user")
-                    break
-
-                participant_id = os.path.basename(participant_folder)
-                self.status.emit(f"Processing participant: {participant_id} ({i + 1}/{len(participant_folders)})")
-
-                # Update overall progress
-                overall_progress = int((i / len(participant_folders)) * 100)
-                self.progress.emit(overall_progress)
-
-                # Process this participant's sessions using the DirectoryProcessingWorker
-                # but we'll collect the results ourselves rather than emitting them
-                participant_results = self._process_participant(participant_folder, participant_id)
+            # Process the participants in parallel, splitting the cores between the participants
+            # and the session folders that each participant's directory worker processes. The
+            # session folders of all participants run on one process pool with a process per core
+            cpu_count = os.cpu_count() or 1
+            participant_threads = min(total_participants, cpu_count)
+            self._folder_threads = max(1, cpu_count // participant_threads)
+
+            self._participant_results = {}
+            self._completed_participants = 0
+            self._total_participants = total_participants
+            self._throttle = _SignalThrottle(self.status, self.progress)
+
+            # Start each participant as soon as its folder is listed
+            pool = QThreadPool()
+            pool.setMaxThreadCount(participant_threads)
+            participant_folders = []
+            self._executor = ProcessPoolExecutor(max_workers=cpu_count, mp_context=_MP_CONTEXT)
+            with self._executor:
+                for participant_folder in iter_subfolders(self.directory_path):
+                    participant_folders.append(participant_folder)
+                    pool.start(_ParticipantRunnable(self, participant_folder))
+                pool.waitForDone()
+            self._executor = None
+            self._throttle.flush()
+
+            if self.should_stop:
+                self.status.emit("Processing stopped by user")
+
+            # Collect the participants' results in folder order so the output does not depend on timing
+            ppi_chunks = {channel: [] for channel in self.channels}
+            hrv_chunks = {channel: [] for channel in self.channels}
+            for participant_folder in participant_folders:
+                participant_results = self._participant_results.get(participant_folder)
 
                 if participant_results:
-                    # Merge the participant's results into our overall results
                     for channel in self.channels:
                         if channel in participant_results:
-                            # Merge PPI data
-                            results[channel]["ppi_data"] = pd.concat(
-                                [results[channel]["ppi_data"], participant_results[channel]["ppi_data"]]
-                            ).sort_values(by="Time")
+                            ppi_chunks[channel].append(participant_results[channel]["ppi_data"])
 
-                            # Merge HRV metrics if available
                             if self.calculate_hrv and "hrv_metrics" in participant_results[channel]:
-                                results[channel]["hrv_metrics"] = pd.concat(
-                                    [results[channel]["hrv_metrics"], participant_results[channel]["hrv_metrics"]]
-                                )
+                                hrv_chunks[channel].append(participant_results[channel]["hrv_metrics"])
+
+            # Merge them into our overall results with a single concat (and sort) per channel
+            for channel in self.channels:
+                if ppi_chunks[channel]:
+                    results[channel]["ppi_data"] = concat_sorted(ppi_chunks[channel], by="Time")
+                if hrv_chunks[channel]:
+                    results[channel]["hrv_metrics"] = pd.concat(hrv_chunks[channel])
 
             # Calculate overall HRV metrics across all participants
             if self.calculate_hrv:
@@ -125,7 +155,7 @@ class BatchWorker(QThread):
                             self.status.emit(f"Calculating overall HRV metrics for {channel}...")
 
                             # Calculate overall metrics
-                            results[channel]["overall_metrics"] = results[channel]["hrv_metrics"].mean()
+                            results[channel]["overall_metrics"] = overall_hrv_metrics(results[channel]["hrv_metrics"])
 
                             # Add time range info to overall metrics if used
                             if self.use_time_range:
@@ -141,17 +171,36 @@ class BatchWorker(QThread):
             self.is_running = False
             self.error.emit(f"Processing error: {str(e)}")
 
+    def _collect_participant(self, participant_folder):
+        """Process a single participant and store its results (runs on the thread pool)"""
+        if self.should_stop:
+            return
+
+        participant_id = os.path.basename(participant_folder)
+        self.status.emit(f"Processing participant: {participant_id}")
+
+        # Process this participant's sessions using the DirectoryProcessingWorker
+        # but we'll collect the results ourselves rather than emitting them
+        participant_results = self._process_participant(participant_folder, participant_id)
+
+        with QMutexLocker(self._results_mutex):
+            self._participant_results[participant_folder] = participant_results
+
+            # Update overall progress
+            self._completed_participants += 1
+            self._throttle.progress(int((self._completed_participants / self._total_participants) * 100))
+
     def _process_participant(self, participant_folder, participant_id):
         """Process a single participant folder with all its session subfolders"""
         try:
-            # Find all session folders for this participant
-            session_folders = [f.path for f in os.scandir(participant_folder) if f.is_dir()]
+            # Count the session folders for this participant
+            session_count = sum(1 for _ in iter_subfolders(participant_folder))
 
-            if not session_folders:
+            if not session_count:
                 self.status.emit(f"No session folders found for participant {participant_id}")
                 return None
 
-            self.status.emit(f"Found {len(session_folders)} sessions for participant {participant_id}")
+            self.status.emit(f"Found {session_count} sessions for participant {participant_id}")
 
             # Initialize results for this participant
             participant_results = {}
@@ -173,8 +222,17 @@ class BatchWorker(QThread):
                 use_time_range=self.use_time_range,
                 start_time=self.start_time,
                 end_time=self.end_time,
+                max_threads=self._folder_threads,
+                zero_phase=self.zero_phase,
+                executor=self._executor,
             )
 
+            # Let stop() reach the folders of this participant
+            with QMutexLocker(self._results_mutex):
+                if self.should_stop:
+                    return None
+                self._active_workers.add(worker)
+
             # Connect to its signals to relay information
             worker.status.connect(self.status.emit)
             worker.error.connect(self.status.emit)  # Only log errors, don't stop overall processing
@@ -183,7 +241,11 @@ class BatchWorker(QThread):
             # We don't connect it directly to avoid having the sub-worker update our main progress
 
             # Process all sessions for this participant
-            worker.run()  # Run synchronously rather than starting a new thread
+            try:
+                worker.run()  # Run synchronously rather than starting a new thread
+            finally:
+                with QMutexLocker(self._results_mutex):
+                    self._active_workers.discard(worker)
 
             # Get results from the worker (this would normally be emitted, but we access it directly)
             session_results = worker._get_results()
@@ -214,3 +276,20 @@ class BatchWorker(QThread):
     def stop(self):
         """Signal the worker to stop processing"""
         self.should_stop = True
+
+        # Also stop the participants that are being processed
+        with QMutexLocker(self._results_mutex):
+            for worker in self._active_workers:
+                worker.stop()
+
+
+class _ParticipantRunnable(QRunnable):
+    """Runnable that processes one participant folder of a BatchWorker on a thread pool"""
+
+    def __init__(self, worker, participant_folder):
+        super().__init__()
+        self.worker = worker
+        self.participant_folder = participant_folder
+
+    def run(self):
+        self.worker._collect_participant(self.participant_folder)
@@ -3,14 +3,24 @@ Worker class for processing a directory of PPG files
 """
 
 import datetime
+import multiprocessing
 import os
+import time
+from contextlib import nullcontext
+import numpy as np
 import pandas as pd
-import neurokit2 as nk
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from PyQt6.QtCore import QThread, pyqtSignal
 
-from ppg_processor.processing.filters import bandpass_filter
-from ppg_processor.processing.hrv_metrics import calculate_hrv_metrics
-from ppg_processor.utils.io_utils import read_ppg_file
+from ppg_processor.processing.filters import bandpass_filter, estimate_sampling_rate
+from ppg_processor.processing.hrv_metrics import calculate_hrv_metrics, clean_ppi, overall_hrv_metrics
+from ppg_processor.processing.peaks import detect_ppg_peaks
+from ppg_processor.utils.io_utils import concat_sorted, iter_subfolders, read_ppg_file
+
+
+# Start the folder processes fresh instead of forking: the parent runs Qt and other threads whose
+# locks a forked child would inherit in whatever state they happen to be
+_MP_CONTEXT = multiprocessing.get_context("spawn")
 
 
 class DirectoryProcessingWorker(QThread):
@@ -23,6 +33,7 @@ class DirectoryProcessingWorker(QThread):
     status = pyqtSignal(str)
     error = pyqtSignal(str)
     finished_with_result = pyqtSignal(dict)
+    folder_finished = pyqtSignal(str, int)  # folder name, PPI values kept across channels
 
     def __init__(
         self,
@@ -35,6 +46,9 @@ class DirectoryProcessingWorker(QThread):
         use_time_range=False,
         start_time=None,
         end_time=None,
+        max_threads=None,
+        zero_phase=True,
+        executor=None,
     ):
         super().__init__()
         self.directory_path = directory_path
@@ -46,11 +60,13 @@ class DirectoryProcessingWorker(QThread):
         self.use_time_range = use_time_range
         self.start_time = start_time
         self.end_time = end_time
+        self.max_threads = max_threads or os.cpu_count() or 1
+        self.zero_phase = zero_phase
+        self.executor = executor  # Process pool shared by the caller, otherwise the worker starts its own
+        self.should_stop = False
 
     def run(self):
         try:
-            self.should_stop = False
-
             self._results = self._process_directory()
 
             if self._results:
@@ -66,8 +82,8 @@ class DirectoryProcessingWorker(QThread):
     def _process_directory(self):
         """Process all PPG files in the participant directory"""
 
-        # Find all folders in the directory with numeric names
-        subfolders = [f.path for f in os.scandir(self.directory_path) if f.is_dir() and f.name.isdigit()]
+        # Find all folders in the directory with numeric names (sorted for consistent processing)
+        subfolders = sorted(iter_subfolders(self.directory_path, numeric_only=True))
 
         if not subfolders:
             self.error.emit(f"No subfolders found in {self.directory_path}")
@@ -75,6 +91,24 @@ class DirectoryProcessingWorker(QThread):
 
         self.status.emit(f"Found {len(subfolders)} folders to process")
 
+        # If time range is enabled, validate it once for all folders
+        self._time_range = None
+        if self.use_time_range and self.start_time and self.end_time:
+            # Convert string times to datetime.time objects
+            start_time = datetime.datetime.strptime(self.start_time, "%H:%M")
+            end_time = datetime.datetime.strptime(self.end_time, "%H:%M")
+
+            # Here we need to a trick because we assume that the days start at 12:00 PM so that we can get night time HRV
+            delta_time = datetime.timedelta(hours=12)
+            if (start_time + delta_time).time() > (end_time + delta_time).time():
+                self.error.emit("Start time must be before end time. Note that times are adjusted by 12 hours to allow night time HRV.")
+                return
+
+            # The 12 hour shift only decides the order of the bounds. The samples are filtered on
+            # their own time of day, where a range across midnight has start > end and between_time
+            # wraps it around, so neither the index nor the peak times need shifting
+            self._time_range = (start_time.time(), end_time.time())
+
         # Initialize results dictionary
         results = {}
         for channel in self.channels:
@@ -83,144 +117,77 @@ class DirectoryProcessingWorker(QThread):
                 "hrv_metrics": pd.DataFrame() if self.calculate_hrv else None,
             }
 
-        # Process each folder
-        subfolders.sort()  # Sort folders for consistent processing
-        for i, folder in enumerate(subfolders):
-            # Update progress
-            progress_pct = int((i / len(subfolders)) * 100)
-            self.progress.emit(progress_pct)
-
-            # Inside the folder loop:
-            ppg_file = os.path.join(folder, "ppg.csv")
-
-            if not os.path.exists(ppg_file):
-                self.status.emit(f"No ppg.csv found in {folder}, skipping")
-                continue
-
-            self.status.emit(f"Processing {ppg_file}")
-
-            try:
-                # Read with folder path for info.txt lookup
-                ppg = read_ppg_file(ppg_file, folder_path=folder)
-
-                # Set datetime as index if it's not already
-                if "datetime" in ppg.columns and not isinstance(ppg.index, pd.DatetimeIndex):
-                    ppg.set_index("datetime", inplace=True)
-                
-                # Assert that the index is a datetime index
-                if not isinstance(ppg.index, pd.DatetimeIndex):
-                    self.error.emit("PPG data must have a datetime index.")
-                    return
-
-                # If time range is enabled, filter the data
-                if self.use_time_range and self.start_time and self.end_time:
-                    # Convert string times to datetime.time objects
-                    start_time = datetime.datetime.strptime(self.start_time, "%H:%M")
-                    end_time = datetime.datetime.strptime(self.end_time, "%H:%M")
-
-                    # Here we need to a trick because we assume that the days start at 12:00 PM so that we can get night time HRV
-                    delta_time = datetime.timedelta(hours=12)
-                    start_time = (start_time + delta_time).time()
-                    end_time = (end_time + delta_time).time()
-
-                    if start_time > end_time:
-                        self.error.emit("Start time must be before end time. Note that times are adjusted by 12 hours to allow night time HRV.")
-                        return
-
-                    # Filter based on time of day
-                    ppg.index = ppg.index + delta_time  # Adjust index to match the time range
-                    ppg = ppg[
-                        (ppg.index.time >= start_time) & (ppg.index.time <= end_time)
-                    ]
-
-                    # If PPG is empty after filtering, emit status
-                    if ppg.empty:
-                        self.status.emit(f"No data points in selected time range: {self.start_time}-{self.end_time}")
-                        continue
-
-                # Calculate sampling rate
-                if isinstance(ppg.index, pd.DatetimeIndex):
-                    time_diffs = ppg.index.to_series().diff().dt.total_seconds()
-                    time_diffs = time_diffs[time_diffs < 10.0]  # Remove outliers
-                    if time_diffs.empty:
-                        self.status.emit(f"Unable to calculate sampling rate for {folder}, skipping")
-                        continue
-                    avg_sampling_rate = 1 / time_diffs.mean()
-                else:
-                    self.status.emit(f"No timestamp column found in {folder}, skipping")
-                    continue
-
-                # Process each channel
-                for channel in self.channels:
-                    if channel not in ppg.columns:
-                        self.status.emit(f"Channel {channel} not found in {folder}")
-                        continue
-
-                    # Apply bandpass filter
-                    has_ambient = "AMBIENT" in ppg.columns
-                    if has_ambient:
-                        ppg[channel] = bandpass_filter(
-                            (ppg[channel] - ppg["AMBIENT"]).to_numpy(),
-                            0.5,
-                            4.0,
-                            avg_sampling_rate,
-                            11,
-                        )
-                    else:
-                        ppg[channel] = bandpass_filter(ppg[channel].to_numpy(), 0.5, 4.0, avg_sampling_rate, 11)
-
-                    # Process PPG data for this channel
-                    hrv_sample, info = nk.ppg_process(
-                        ppg[channel].to_numpy(),
-                        sampling_rate=int(avg_sampling_rate),
-                    )
-
-                    # Extract peaks
-                    data_sample = ppg[[channel]].copy().reset_index()
-                    data_sample["PPG_Peaks"] = hrv_sample["PPG_Peaks"]
-                    data_sample["Quality"] = hrv_sample["PPG_Quality"]
-                    data_sample = data_sample[data_sample["PPG_Peaks"] == 1]
-
-                    # Rename datetime column to Time for consistency
-                    if "index" in data_sample.columns:
-                        data_sample.rename(columns={"index": "Time"}, inplace=True)
-                    elif "datetime" in data_sample.columns:
-                        data_sample.rename(columns={"datetime": "Time"}, inplace=True)
-                    elif "timestamp" in data_sample.columns:
-                        data_sample.rename(columns={"timestamp": "Time"}, inplace=True)
-
-                    # Sort by time
-                    data_sample = data_sample.sort_values(by="Time")
-                    
-                    # Revert the delta time adjustment
-                    if self.use_time_range:
-                        data_sample["Time"] = data_sample["Time"] - delta_time
-
-                    # Calculate PPI values
-                    data_sample["PPI"] = data_sample["Time"].diff().dt.total_seconds() * 1000  # ms
-
-                    # Clean PPI data - remove outliers
-                    if "PPI" in data_sample.columns:
-                        # Remove first row (NaN PPI) and rows outside threshold
-                        data_sample = data_sample.dropna(subset=["PPI"])
-                        initial_len = len(data_sample)
-                        data_sample = data_sample[
-                            (data_sample["PPI"] >= self.ppi_low_threshold)
-                            & (data_sample["PPI"] <= self.ppi_high_threshold)
-                        ]
-                        removed = initial_len - len(data_sample)
-                        self.status.emit(f"Removed {removed} outlier PPI values from {folder}")
-
-                    # Add folder name as identifier
-                    data_sample["Folder"] = os.path.basename(folder)
-
-                    # Append to results
-                    results[channel]["ppi_data"] = pd.concat([results[channel]["ppi_data"], data_sample]).sort_values(
-                        by="Time"
-                    )
-
-            except Exception as e:
-                self.status.emit(f"Error processing {folder}: {str(e)}")
+        # Process the folders in parallel, one worker process per core. When there are fewer
+        # folders than cores, the spare cores process the channels of each folder in threads
+        folder_processes = min(self.max_threads, len(subfolders))
+        params = {
+            "channels": self.channels,
+            "time_range": self._time_range,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "ppi_low_threshold": self.ppi_low_threshold,
+            "ppi_high_threshold": self.ppi_high_threshold,
+            "zero_phase": self.zero_phase,
+            "channel_threads": max(1, self.max_threads // folder_processes),
+        }
+        folder_results = {}
+        outliers_removed = 0
+        failed_folders = 0
+        throttle = _SignalThrottle(self.status, self.progress)
+
+        if self.executor is not None:
+            pool = nullcontext(self.executor)
+        else:
+            pool = ProcessPoolExecutor(max_workers=folder_processes, mp_context=_MP_CONTEXT)
+
+        with pool as executor:
+            futures = {executor.submit(_process_one_folder, folder, params): folder for folder in subfolders}
+
+            for completed, future in enumerate(as_completed(futures), start=1):
+                # Cancel the folders that have not started yet so a stop takes effect promptly,
+                # only the folders collected so far are combined. Only this worker's folders are
+                # cancelled, as a shared pool may also run other folders
+                if self.should_stop:
+                    for pending in futures:
+                        pending.cancel()
+                    throttle.status("Processing stopped by user")
+                    break
+
+                folder = futures[future]
+                try:
+                    folder_results[folder], messages, warnings, removed = future.result()
+                except Exception as e:
+                    folder_results[folder], messages, removed = {}, [], 0
+                    warnings = [f"Error processing {folder}: {str(e)}"]
+                    failed_folders += 1
+                outliers_removed += removed
+
+                for message in messages:
+                    throttle.status(message)
+                for warning in warnings:
+                    throttle.notice(warning)
+
+                # Update progress
+                throttle.progress(int((completed / len(subfolders)) * 100))
+
+                # Stream a summary of the folder to listeners as soon as it is done
+                self.folder_finished.emit(
+                    os.path.basename(folder), sum(len(df) for df in folder_results[folder].values())
+                )
+
+        # Report the outliers once for the whole directory rather than per folder and channel
+        throttle.status(f"Removed {outliers_removed} outlier PPI values from {len(folder_results)} folders")
+        if failed_folders:
+            throttle.notice(f"{failed_folders} of {len(subfolders)} folders failed to process, see the errors above")
+
+        # Make sure the last status message and progress are shown
+        throttle.flush()
+
+        # Combine the peaks of all folders with a single concat and sort per channel
+        for channel in self.channels:
+            chunks = [folder_results[folder][channel] for folder in subfolders if channel in folder_results.get(folder, {})]
+            if chunks:
+                results[channel]["ppi_data"] = concat_sorted(chunks, by="Time")
 
         # Fill progress bar
         self.progress.emit(100)
@@ -239,17 +206,19 @@ class DirectoryProcessingWorker(QThread):
                         )
 
                         # Calculate overall metrics
-                        results[channel]["overall_metrics"] = results[channel]["hrv_metrics"].mean()
+                        results[channel]["overall_metrics"] = overall_hrv_metrics(results[channel]["hrv_metrics"])
 
                         # Add folder information if possible
-                        if "Folder" in results[channel]["ppi_data"].columns:
+                        hrv_metrics = results[channel]["hrv_metrics"]
+                        if "Folder" in results[channel]["ppi_data"].columns and not hrv_metrics.empty:
                             # For each window, find closest ppi data point and get its folder
-                            for idx, row in results[channel]["hrv_metrics"].iterrows():
-                                start_time = row["Start_Time"]
-                                closest_idx = abs(results[channel]["ppi_data"]["Time"] - start_time).idxmin()
-                                results[channel]["hrv_metrics"].at[idx, "Folder"] = results[channel]["ppi_data"].at[
-                                    closest_idx, "Folder"
-                                ]
+                            ppi_data = results[channel]["ppi_data"]
+                            hrv_metrics["Folder"] = ppi_data["Folder"].to_numpy()[
+                                _nearest_positions(
+                                    ppi_data["Time"].to_numpy(dtype="datetime64[ns]").view("i8"),
+                                    hrv_metrics["Start_Time"].to_numpy(dtype="datetime64[ns]").view("i8"),
+                                )
+                            ]
 
                         self.status.emit(f"Calculated HRV metrics for {len(results[channel]['hrv_metrics'])} windows")
                     except Exception as e:
@@ -260,3 +229,183 @@ class DirectoryProcessingWorker(QThread):
     def stop(self):
         """Stop the processing thread"""
         self.should_stop = True
+
+
+def _nearest_positions(sorted_times, targets):
+    """
+    Positions of the values of a sorted int64 array closest to each target, ties go to the earlier value
+    """
+    if len(sorted_times) < 2:
+        return np.zeros(len(targets), dtype=np.intp)
+
+    k = np.searchsorted(sorted_times, targets).clip(1, len(sorted_times) - 1)
+
+    # Step back wherever the previous value is at least as close
+    k -= (targets - sorted_times[k - 1]) <= (sorted_times[k] - targets)
+    return k
+
+
+class _SignalThrottle:
+    """
+    Rate limits the status and progress signals emitted from a processing loop
+
+    Only the latest routine status message and progress value are kept between emissions,
+    and progress is only emitted when its integer percentage changes. Errors and warnings
+    go through notice(), which always emits them
+    """
+
+    def __init__(self, status_signal, progress_signal, interval=0.05):
+        self.status_signal = status_signal
+        self.progress_signal = progress_signal
+        self.interval = interval
+        self._last_emit = float("-inf")
+        self._pending_status = None
+        self._pending_progress = None
+        self._last_progress = None
+
+    def status(self, message):
+        self._pending_status = message
+        self._maybe_flush()
+
+    def notice(self, message):
+        """Emit a message that must not be dropped, after the pending status so the order is kept"""
+        self.flush()
+        self.status_signal.emit(message)
+
+    def progress(self, value):
+        if value != self._last_progress:
+            self._pending_progress = value
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_emit >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Emit the pending status message and progress value, if any"""
+        if self._pending_status is not None:
+            self.status_signal.emit(self._pending_status)
+            self._pending_status = None
+        if self._pending_progress is not None:
+            self.progress_signal.emit(self._pending_progress)
+            self._last_progress = self._pending_progress
+            self._pending_progress = None
+        self._last_emit = time.monotonic()
+
+
+def _process_one_folder(folder, params):
+    """
+    Detect the peaks of every channel in a single folder (runs in a worker process)
+
+    Returns the peaks keyed by channel together with the routine status messages and
+    the warnings for the folder, which the calling worker emits since worker processes
+    cannot emit signals, and the number of outlier PPI values removed across its channels
+    """
+    folder_results = {}
+    messages = []
+    warnings = []
+    removed = 0
+
+    ppg_file = os.path.join(folder, "ppg.csv")
+
+    if not os.path.exists(ppg_file):
+        warnings.append(f"No ppg.csv found in {folder}, skipping")
+        return folder_results, messages, warnings, removed
+
+    messages.append(f"Processing {ppg_file}")
+
+    # Read with folder path for info.txt lookup
+    ppg = read_ppg_file(ppg_file, folder_path=folder)
+
+    # Set datetime as index if it's not already
+    if "datetime" in ppg.columns and not isinstance(ppg.index, pd.DatetimeIndex):
+        ppg.set_index("datetime", inplace=True)
+
+    # Assert that the index is a datetime index
+    if not isinstance(ppg.index, pd.DatetimeIndex):
+        raise ValueError("PPG data must have a datetime index.")
+
+    # Sort the samples once (a cheap check in the usual already-sorted case)
+    # so the time filter and the peak times downstream see an ordered index
+    if not ppg.index.is_monotonic_increasing:
+        ppg = ppg.sort_index(kind="stable")
+
+    # If time range is enabled, filter the data
+    if params["time_range"] is not None:
+        start_time, end_time = params["time_range"]
+
+        # Filter based on time of day
+        ppg = ppg.between_time(start_time, end_time)  # Inclusive, works on the int64 index directly
+
+        # If PPG is empty after filtering, report it
+        if ppg.empty:
+            warnings.append(f"No data points in selected time range: {params['start_time']}-{params['end_time']}")
+            return folder_results, messages, warnings, removed
+
+    # Calculate sampling rate
+    avg_sampling_rate = estimate_sampling_rate(ppg.index)
+    if avg_sampling_rate is None:
+        warnings.append(f"Unable to calculate sampling rate for {folder}, skipping")
+        return folder_results, messages, warnings, removed
+
+    # Apply the bandpass filter to all the channels at once
+    channels = [channel for channel in params["channels"] if channel in ppg.columns]
+    for channel in params["channels"]:
+        if channel not in ppg.columns:
+            warnings.append(f"Channel {channel} not found in {folder}")
+
+    # The filtered signals are kept as raw ndarray columns rather than written back into the frame
+    filtered = {}
+    if channels:
+        signals = ppg[channels].to_numpy(dtype=float)
+        if "AMBIENT" in ppg.columns:
+            signals = signals - ppg["AMBIENT"].to_numpy(dtype=float)[:, None]
+        signals = bandpass_filter(
+            signals, 0.5, 4.0, avg_sampling_rate, 11, axis=0, zero_phase=params["zero_phase"]
+        )
+        filtered = {channel: signals[:, i] for i, channel in enumerate(channels)}
+
+    # Detect the peaks of each channel, in threads if this folder has spare cores
+    # (neurokit2 spends most of its time in NumPy and SciPy, which release the GIL)
+    def detect_peaks(channel):
+        return detect_ppg_peaks(filtered[channel], avg_sampling_rate)
+
+    channel_threads = min(params["channel_threads"], len(channels))
+    if channel_threads > 1:
+        with ThreadPoolExecutor(max_workers=channel_threads) as executor:
+            processed = dict(zip(channels, executor.map(detect_peaks, channels)))
+    else:
+        processed = {channel: detect_peaks(channel) for channel in channels}
+
+    for channel in channels:
+        peak_idx, quality = processed[channel]
+
+        # Find the peaks in time order, keeping only their positions in the full-length signal
+        peak_times = ppg.index.asi8[peak_idx]
+        order = np.argsort(peak_times, kind="stable")
+        peak_idx = peak_idx[order]
+
+        # Calculate PPI values and remove outliers (and the first peak, which has no PPI)
+        keep, ppi = clean_ppi(peak_times[order], params["ppi_low_threshold"], params["ppi_high_threshold"])
+        removed += max(len(peak_idx) - 1, 0) - len(keep)
+        peak_idx = peak_idx[keep]
+
+        peak_times = ppg.index[peak_idx]
+
+        # Build the peak frame from the kept samples only
+        data_sample = pd.DataFrame(
+            {
+                "Time": peak_times,
+                channel: filtered[channel][peak_idx],
+                "PPG_Peaks": 1,
+                "Quality": quality[peak_idx],
+                "PPI": ppi,
+            }
+        )
+
+        # Add folder name as identifier
+        data_sample["Folder"] = os.path.basename(folder)
+
+        folder_results[channel] = data_sample
+
+    return folder_results, messages, warnings, removed
@@ -4,13 +4,14 @@ Worker class for processing a single PPG file
 
 import datetime
 
+import numpy as np
 import pandas as pd
-import neurokit2 as nk
 from PyQt6.QtCore import QThread, pyqtSignal
 
-from ppg_processor.processing.filters import bandpass_filter
-from ppg_processor.processing.hrv_metrics import calculate_hrv_metrics
-from ppg_processor.utils.io_utils import read_ppg_file
+from ppg_processor.processing.filters import bandpass_filter, estimate_sampling_rate
+from ppg_processor.processing.hrv_metrics import calculate_hrv_metrics, overall_hrv_metrics
+from ppg_processor.processing.peaks import detect_ppg_peaks
+from ppg_processor.utils.io_utils import read_ppg_file_cached
 
 class PPGProcessingWorker(QThread):
     """
@@ -32,6 +33,7 @@ class PPGProcessingWorker(QThread):
         use_time_range=False,
         start_time=None,
         end_time=None,
+        zero_phase=True,
     ):
         super().__init__()
         self.file_path = file_path
@@ -43,12 +45,13 @@ class PPGProcessingWorker(QThread):
         self.use_time_range = use_time_range
         self.start_time = start_time
         self.end_time = end_time
+        self.zero_phase = zero_phase
         
     def run(self):
         try:          
             self.status.emit(f"Reading PPG file: {self.file_path}")
             try:
-                ppg = read_ppg_file(self.file_path)
+                ppg = read_ppg_file_cached(self.file_path)
             except ValueError as e:
                 self.error.emit(str(e))
                 return
@@ -62,6 +65,11 @@ class PPGProcessingWorker(QThread):
                 self.error.emit("PPG data must have a datetime index.")
                 return
 
+            # Sort the samples once (a cheap check in the usual already-sorted case)
+            # so the time filter and the peak times downstream see an ordered index
+            if not ppg.index.is_monotonic_increasing:
+                ppg = ppg.sort_index(kind="stable")
+
             # If time range is enabled, filter the data
             if self.use_time_range and self.start_time and self.end_time:
                 # Convert string times to datetime.time objects
@@ -70,18 +78,13 @@ class PPGProcessingWorker(QThread):
 
                 # Here we need to a trick because we assume that the days start at 12:00 PM so that we can get night time HRV
                 delta_time = datetime.timedelta(hours=12)
-                start_time = (start_time + delta_time).time()
-                end_time = (end_time + delta_time).time()
-
-                if start_time > end_time:
+                if (start_time + delta_time).time() > (end_time + delta_time).time():
                     self.error.emit("Start time must be before end time. Note that times are adjusted by 12 hours to allow night time HRV.")
                     return
 
-                # Filter based on time of day
-                ppg.index = ppg.index + delta_time  # Adjust index to match the time range
-                ppg = ppg[
-                    (ppg.index.time >= start_time) & (ppg.index.time <= end_time)
-                ]
+                # Filter based on time of day. The 12 hour shift only decides the order of the bounds,
+                # a range across midnight has start > end and between_time wraps it around
+                ppg = ppg.between_time(start_time.time(), end_time.time())  # Inclusive, works on the int64 index directly
 
                 # If PPG is empty after filtering, emit error
                 if ppg.empty:
@@ -94,43 +97,33 @@ class PPGProcessingWorker(QThread):
                 
             # Calculate sampling rate
             self.status.emit("Calculating sampling rate...")
-            if isinstance(ppg.index, pd.DatetimeIndex):
-                time_diffs = ppg.index.to_series().diff().dt.total_seconds()
-            else:
+            if not isinstance(ppg.index, pd.DatetimeIndex):
                 self.error.emit("Index is not a datetime index. Cannot calculate sampling rate.")
                 return
-                
-            time_diffs = time_diffs[time_diffs < 10.0]  # Remove outliers
-            if time_diffs.empty:
+
+            avg_sampling_rate = estimate_sampling_rate(ppg.index)
+            if avg_sampling_rate is None:
                 self.error.emit("Unable to calculate sampling rate from timestamps.")
                 return
                 
-            avg_sampling_rate = 1 / time_diffs.mean()
             self.status.emit(f"Average sampling rate: {avg_sampling_rate:.2f} Hz")
 
             # Preprocess the PPG data (apply bandpass filter)
             self.status.emit("Preprocessing PPG signals...")
             try:
-                # Check if AMBIENT column exists
-                has_ambient = "AMBIENT" in ppg.columns
-                
-                # Process each channel
                 for channel in self.channels:
                     if channel not in ppg.columns:
                         self.error.emit(f"Channel {channel} not found in data.")
-                        continue
-                        
-                    # Remove ambient if available and apply filter
-                    if has_ambient:
-                        ppg[channel] = bandpass_filter(
-                            (ppg[channel] - ppg["AMBIENT"]).to_numpy(), 
-                            0.5, 4.0, avg_sampling_rate, 11
-                        )
-                    else:
-                        ppg[channel] = bandpass_filter(
-                            ppg[channel].to_numpy(), 
-                            0.5, 4.0, avg_sampling_rate, 11
-                        )
+
+                # Remove ambient if available and filter all the channels at once
+                channels = [channel for channel in self.channels if channel in ppg.columns]
+                if channels:
+                    signals = ppg[channels].to_numpy(dtype=float)
+                    if "AMBIENT" in ppg.columns:
+                        signals = signals - ppg["AMBIENT"].to_numpy(dtype=float)[:, None]
+                    ppg[channels] = bandpass_filter(
+                        signals, 0.5, 4.0, avg_sampling_rate, 11, axis=0, zero_phase=self.zero_phase
+                    )
             except Exception as e:
                 self.error.emit(f"Error preprocessing PPG: {str(e)}")
                 return
@@ -143,13 +136,12 @@ class PPGProcessingWorker(QThread):
                 if channel not in ppg.columns:
                     continue
                     
-                hrv_results = pd.DataFrame()
-                total_windows = len(list(ppg.groupby(pd.Grouper(freq=f"{self.window_size}min"))))
+                window_peaks = []
+                windows = ppg.groupby(pd.Grouper(freq=f"{self.window_size}min"))
+                total_windows = windows.ngroups
                 
-                for j, sample in enumerate(ppg.groupby(pd.Grouper(freq=f"{self.window_size}min"))):
-                    current_time = sample[0]
+                for j, (current_time, data) in enumerate(windows):
                     try:     
-                        data = sample[1]
                         
                         if data.empty:
                             continue
@@ -158,42 +150,34 @@ class PPGProcessingWorker(QThread):
                         progress_pct = int((j / total_windows) * 100 / len(self.channels) + (i * 100 / len(self.channels)))
                         self.progress.emit(progress_pct)
                         
-                        # Process PPG data
-                        hrv_sample, info = nk.ppg_process(
-                            data[channel].to_numpy(), 
-                            sampling_rate=int(avg_sampling_rate)
-                        )
+                        # Detect the peaks of the (already filtered) PPG data
+                        peak_idx, quality = detect_ppg_peaks(data[channel].to_numpy(), avg_sampling_rate)
                         
-                        # Extract peaks and create dataframe
-                        data_sample = data[[channel]].copy().reset_index()
-                        data_sample["PPG_Peaks"] = hrv_sample["PPG_Peaks"]
-                        data_sample["Quality"] = hrv_sample["PPG_Quality"]
-                        data_sample = data_sample[data_sample["PPG_Peaks"] == 1]
+                        # Create a dataframe from the peak samples only
+                        data_sample = pd.DataFrame(
+                            {
+                                "Time": data.index[peak_idx],
+                                channel: data[channel].to_numpy()[peak_idx],
+                                "PPG_Peaks": 1,
+                                "Quality": quality[peak_idx],
+                            }
+                        )
                         
-                        # Concatenate results
-                        hrv_results = pd.concat([hrv_results, data_sample], ignore_index=True)
+                        # Collect the window's peaks, they are concatenated once below
+                        window_peaks.append(data_sample)
                         
                     except Exception as e:
                         self.status.emit(f"Error processing window at {current_time}: {str(e)}")
                         continue
                 
+                hrv_results = pd.concat(window_peaks, ignore_index=True) if window_peaks else pd.DataFrame()
+
                 # Calculate PPI values
                 if not hrv_results.empty:
-                    if isinstance(hrv_results.index, pd.DatetimeIndex):
-                        hrv_results = hrv_results.reset_index()
-                        hrv_results.rename(columns={'index': 'Time'}, inplace=True)
-
-                    elif 'datetime' in hrv_results.columns:
-                        hrv_results.rename(columns={'datetime': 'Time'}, inplace=True)
-
-                    elif 'timestamp' in hrv_results.columns:
-                        hrv_results.rename(columns={'timestamp': 'Time'}, inplace=True)
-                    
-                    hrv_results = hrv_results.sort_values(by='Time')
-
-                    # If time range was enabled, we need to revert back the time delta
-                    if self.use_time_range:
-                        hrv_results['Time'] = hrv_results['Time'] - delta_time
+                    # The windows come out in time order, so only sort if the index was out of order
+                    if not hrv_results['Time'].is_monotonic_increasing:
+                        order = np.argsort(hrv_results['Time'].to_numpy().view('i8'), kind='stable')
+                        hrv_results = hrv_results.take(order)
 
                     hrv_results['PPI'] = hrv_results['Time'].diff().dt.total_seconds() * 1000  # ms
                 
@@ -204,10 +188,8 @@ class PPGProcessingWorker(QThread):
                     # Remove first row (NaN PPI) and rows outside threshold
                     cleaned_results = cleaned_results.dropna(subset=['PPI'])
                     initial_len = len(cleaned_results)
-                    cleaned_results = cleaned_results[
-                        (cleaned_results['PPI'] >= self.ppi_low_threshold) & 
-                        (cleaned_results['PPI'] <= self.ppi_high_threshold)
-                    ]
+                    ppi = cleaned_results['PPI'].to_numpy()
+                    cleaned_results = cleaned_results[(ppi >= self.ppi_low_threshold) & (ppi <= self.ppi_high_threshold)]
                     removed = initial_len - len(cleaned_results)
                     self.status.emit(f"Removed {removed} outlier PPI values from channel {channel}")
                 
@@ -224,7 +206,7 @@ class PPGProcessingWorker(QThread):
                         )
                         
                         # Calculate overall HRV metrics
-                        overall_metrics = hrv_metrics.mean()
+                        overall_metrics = overall_hrv_metrics(hrv_metrics)
                         
                         # Add time range info to overall metrics if used
                         if self.use_time_range:
@@ -1,8 +1,25 @@
+from functools import lru_cache
+
 import numpy as np
-from scipy.signal import butter, sosfiltfilt
+import pandas as pd
+from scipy.signal import butter, sosfilt, sosfilt_zi, sosfiltfilt
+
+
+@lru_cache(maxsize=64)
+def _bandpass_sos(lowcut: float, highcut: float, fs: float, order: int) -> np.ndarray:
+    """Design the second-order sections of a Butterworth bandpass filter (cached per design)"""
+    nyq = 0.5 * fs
+    return butter(order, [lowcut / nyq, highcut / nyq], btype="bandpass", output="sos")
+
 
 def bandpass_filter(
-    s: np.ndarray, lowcut: float, highcut: float, fs: float, order: int = 5
+    s: np.ndarray,
+    lowcut: float,
+    highcut: float,
+    fs: float,
+    order: int = 5,
+    axis: int = -1,
+    zero_phase: bool = True,
 ) -> np.ndarray:
     """
     Apply a Butterworth bandpass filter to the signal.
@@ -13,6 +30,9 @@ def bandpass_filter(
     - highcut (float): The high cutoff frequency of th filter.
     - fs (int): Sampling frequency of the signal
     - order (int): Order of the filter
+    - axis (int): Axis along which to filter, e.g. 0 to filter every column of a (samples, channels) array at once
+    - zero_phase (bool): Filter forwards and backwards (no phase shift). If False, a single forward pass
+      started from the steady state of the first sample is used, which is about twice as fast but delays the signal
 
     ### Returns:
     Array-like, the filtered signal.
@@ -27,9 +47,32 @@ def bandpass_filter(
       >>> filtered_data = highpass_filter(data, lc, hc, fs, order=5)
 
     """
-    nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    sos = butter(order, [low, high], btype="bandpass", output="sos")
-    y = sosfiltfilt(sos, s)
-    return y
\ No newline at end of file
+    # The sampling rate is estimated from the timestamps, so rounding it lets repeated
+    # files with the same rate share the filter design
+    sos = _bandpass_sos(lowcut, highcut, round(fs, 3), order)
+    if zero_phase:
+        return sosfiltfilt(sos, s, axis=axis)
+
+    # Single forward pass along the last axis, starting from the steady state of the first sample
+    x = np.moveaxis(np.asarray(s), axis, -1)
+    zi = sosfilt_zi(sos).reshape((sos.shape[0],) + (1,) * (x.ndim - 1) + (2,)) * x[np.newaxis, ..., :1]
+    y, _ = sosfilt(sos, x, axis=-1, zi=zi)
+    return np.moveaxis(y, -1, axis)
+
+def estimate_sampling_rate(index: pd.DatetimeIndex, max_gap: float = 10.0) -> float | None:
+    """
+    Estimate the average sampling rate of a signal from its timestamps.
+
+    ### Args:
+    - index (pd.DatetimeIndex): Timestamps of the samples.
+    - max_gap (float): Time differences of this many seconds or more are treated as recording gaps and ignored.
+
+    ### Returns:
+    The average sampling rate in Hz, or None if no valid time differences are found.
+    """
+    # Differences of the int64 nanosecond timestamps, in seconds
+    time_diffs = np.diff(index.asi8) * 1e-9
+    time_diffs = time_diffs[(time_diffs > 0) & (time_diffs < max_gap)]  # Remove outliers
+    if time_diffs.size == 0:
+        return None
+    return 1 / time_diffs.mean()
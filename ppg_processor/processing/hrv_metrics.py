@@ -1,5 +1,4 @@
 import os
-from datetime import timedelta
 
 import numpy as np
 import pandas as pd
@@ -39,6 +38,33 @@ def clean_ppi_data(df: pd.DataFrame, low: int = 667, high: int = 2000) -> pd.Dat
     return cleaned
 
 
+def clean_ppi(times_ns: np.ndarray, low: float = 667, high: float = 2000) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate and clean PPI values from sorted peak timestamps in a single pass
+
+    Args:
+        times_ns (np.ndarray): Sorted peak timestamps as int64 nanoseconds
+        low (float): Lower bound for valid PPI values
+        high (float): Upper bound for valid PPI values
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Positions of the peaks that end a valid PPI and their PPI values in ms
+    """
+    ppi = np.diff(times_ns) * 1e-6  # ns to ms
+    keep = np.flatnonzero((ppi >= low) & (ppi <= high))
+    return keep + 1, ppi[keep]
+
+
+# Floating point metrics returned by calculate_metrics (besides the Num_Data_Points count)
+_METRIC_NAMES = ["MeanNN", "SDNN", "RMSSD", "SDSD", "CVNN", "CVSD", "MedianNN", "Mean_Quality"]
+
+# Columns of the per-window HRV metrics, in output order
+_HRV_COLUMNS = [
+    "MeanNN", "SDNN", "RMSSD", "SDSD", "CVNN", "CVSD", "MedianNN",
+    "Num_Data_Points", "Mean_Quality", "Start_Time", "End_Time",
+]
+
+
 # Define HRV metrics calculation
 def calculate_metrics(ppi_data, quality_data):
     if len(ppi_data) < 2:
@@ -55,10 +81,14 @@ def calculate_metrics(ppi_data, quality_data):
             "Mean_Quality": np.nan
         }
 
-    mean_nn = np.mean(ppi_data)
-    sdnn = np.std(ppi_data, ddof=1)
-    rmssd = np.sqrt(np.mean(np.diff(ppi_data) ** 2))
-    sdsd = np.std(np.diff(ppi_data), ddof=1)
+    # Convert once and compute the successive differences once for RMSSD and SDSD
+    ppi_data = np.asarray(ppi_data, dtype=np.float64)
+    diffs = np.diff(ppi_data)
+
+    mean_nn = ppi_data.mean()
+    sdnn = ppi_data.std(ddof=1)
+    rmssd = np.sqrt(np.dot(diffs, diffs) / diffs.size)
+    sdsd = diffs.std(ddof=1)
 
     metrics = {
         "MeanNN": mean_nn,
@@ -80,66 +110,71 @@ def calculate_hrv_metrics(data: pd.DataFrame, window: int = 5) -> pd.DataFrame:
     Calculate HRV metrics from PPI data
     
     Args:
-        data (pd.DataFrame): DataFrame containing columns "Time", "PPI", and "Quality"
+        data (pd.DataFrame): DataFrame containing columns "Time", "PPI", and "Quality", sorted by "Time"
 
     Returns:
         pd.DataFrame: DataFrame containing HRV metrics for each x-minute window
     """
 
-    # Initialize variables
-    hrv_results = []
-    current_bin = []
-    current_start_time = None
-
-    for i, row in data.iterrows():
-        if current_start_time is None:
-            # Initialize the first n-minute bin
-            current_start_time = row["Time"]
-
-        # Check if row falls within the current n-minute bin
-        if row["Time"] - current_start_time <= timedelta(minutes=window):
-            
-            # Check for gap larger than 1 minute
-            if len(current_bin) > 0 and row["Time"] - current_bin[-1]["Time"] > timedelta(minutes=1):
-
-                # Close the current bin due to a large gap
-                if len(current_bin) > 1:
-                    metrics = calculate_metrics(
-                        [x["PPI"] for x in current_bin],
-                        [x["Quality"] for x in current_bin]
-                    )
-                    metrics["Start_Time"] = current_start_time
-                    metrics["End_Time"] = current_bin[-1]["Time"]
-                    hrv_results.append(metrics)
-                # Start a new bin
-                current_bin = [{"Time": row["Time"], "PPI": row["PPI"], "Quality": row["Quality"]}]
-                current_start_time = row["Time"]
-            else:
-                # Add row to the current bin
-                current_bin.append({"Time": row["Time"], "PPI": row["PPI"], "Quality": row["Quality"]})
-        else:
-            # Bin exceeds 5 minutes, close it
-            if len(current_bin) > 1:
-                metrics = calculate_metrics(
-                    [x["PPI"] for x in current_bin],
-                    [x["Quality"] for x in current_bin]
-                )
-                metrics["Start_Time"] = current_start_time
-                metrics["End_Time"] = current_bin[-1]["Time"]
-                hrv_results.append(metrics)
-            # Start a new bin
-            current_bin = [{"Time": row["Time"], "PPI": row["PPI"], "Quality": row["Quality"]}]
-            current_start_time = row["Time"]
-
-    # Close the last bin
-    if len(current_bin) > 1:
-        metrics = calculate_metrics(
-            [x["PPI"] for x in current_bin],
-            [x["Quality"] for x in current_bin]
-        )
-        metrics["Start_Time"] = current_start_time
-        metrics["End_Time"] = current_bin[-1]["Time"]
-        hrv_results.append(metrics)
+    # Work on the raw arrays; the data is sorted by time, so bins are contiguous slices
+    times = data["Time"].to_numpy(dtype="datetime64[ns]")  # Whatever the stored resolution, work in ns
+    t = times.view("i8")
+    ppi = data["PPI"].to_numpy()
+    quality = data["Quality"].to_numpy()
+
+    window_ns = int(window * 60 * 10**9)
+    gap_ns = 60 * 10**9
+
+    # Positions where a gap larger than 1 minute forces a new bin
+    gap_starts = np.flatnonzero(np.diff(t) > gap_ns) + 1
+
+    # Find the bins first: a bin ends at the first point more than `window` minutes after its start or after a gap
+    bin_starts = []
+    bin_ends = []
+    start = 0
+    while start < len(t):
+        end = np.searchsorted(t, t[start] + window_ns, side="right")
+        next_gap = np.searchsorted(gap_starts, start, side="right")
+        if next_gap < len(gap_starts):
+            end = min(end, gap_starts[next_gap])
+
+        # Bins with a single point are dropped
+        if end - start > 1:
+            bin_starts.append(start)
+            bin_ends.append(end)
+
+        start = end
+
+    if not bin_starts:
+        return pd.DataFrame()
+
+    # Fill one preallocated column per metric instead of building a dict per bin
+    bin_starts = np.asarray(bin_starts)
+    bin_ends = np.asarray(bin_ends)
+    columns = {name: np.empty(len(bin_starts)) for name in _METRIC_NAMES}
+    columns["Num_Data_Points"] = bin_ends - bin_starts
+
+    for i, (start, end) in enumerate(zip(bin_starts, bin_ends)):
+        metrics = calculate_metrics(ppi[start:end], quality[start:end])
+        for name in _METRIC_NAMES:
+            columns[name][i] = metrics[name]
+
+    columns["Start_Time"] = times[bin_starts]
+    columns["End_Time"] = times[bin_ends - 1]
 
     # Save HRV results for the file
-    return pd.DataFrame(hrv_results)
\ No newline at end of file
+    return pd.DataFrame(columns, columns=_HRV_COLUMNS)
+
+
+def overall_hrv_metrics(hrv_metrics: pd.DataFrame) -> pd.Series:
+    """
+    Average the per-window HRV metrics over all windows
+
+    Args:
+        hrv_metrics (pd.DataFrame): DataFrame of per-window HRV metrics
+
+    Returns:
+        pd.Series: Mean of each numeric metric; label columns such as Participant or Folder are skipped
+    """
+    numeric_cols = hrv_metrics.select_dtypes(include=np.number).columns
+    return hrv_metrics[numeric_cols].mean()
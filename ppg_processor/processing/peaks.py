@@ -0,0 +1,23 @@
+import neurokit2 as nk
+import numpy as np
+
+
+def detect_ppg_peaks(signal: np.ndarray, sampling_rate: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Detect the systolic peaks of an already bandpass-filtered PPG signal and rate its quality
+
+    Unlike nk.ppg_process, the signal is not cleaned again (a second filter pass) and no
+    heart rate is interpolated, since only the peaks and their quality are used.
+
+    Args:
+        signal (np.ndarray): Bandpass-filtered PPG signal
+        sampling_rate (float): Sampling rate of the signal in Hz
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Sample positions of the peaks and the quality of every sample
+    """
+    sampling_rate = int(sampling_rate)
+    _, info = nk.ppg_peaks(signal, sampling_rate=sampling_rate, method="elgendi")
+    peaks = np.asarray(info["PPG_Peaks"], dtype=np.intp)
+    quality = np.asarray(nk.ppg_quality(signal, ppg_pw_peaks=peaks, sampling_rate=sampling_rate))
+    return peaks, quality
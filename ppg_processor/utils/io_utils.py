@@ -1,8 +1,22 @@
+import functools
+import mmap
 import re
 import os
 import pandas as pd
 import numpy as np
 
+# Columns parsed from the PPG CSVs (timestamp or delta, P0, P1, P2, AMBIENT) and their types. The
+# sensor samples are integer ADC counts, so float32 holds them exactly at half the memory of float64
+_PPG_USECOLS = range(5)
+_PPG_DTYPES = {0: np.float64, 1: np.float32, 2: np.float32, 3: np.float32, 4: np.float32}
+_BASE_COLS = ('col0', 'P0', 'P1', 'P2', 'AMBIENT')
+
+# Start time (unix seconds) of delta-format recordings in info.txt, matched on the raw bytes
+_START_TIME_RE = re.compile(rb'start_time:\s*(\d+)')
+
+# User-space buffer of the output files, so that slow (network) drives see few large writes
+WRITE_BUFFER_SIZE = 1 << 20
+
 def read_ppg_file(file_path: str, folder_path: str = None) -> pd.DataFrame:
     """
     Read PPG data from CSV file without headers, handling different formats:
@@ -14,88 +28,185 @@ def read_ppg_file(file_path: str, folder_path: str = None) -> pd.DataFrame:
         folder_path (str, optional): Path to the folder containing the file (for info.txt)
         
     Returns:
-        pd.DataFrame: DataFrame with standardized columns
+        pd.DataFrame: DataFrame with float32 P0, P1, P2 and AMBIENT columns and a datetime column
     """
     try:
-        # Read CSV without headers
-        df = pd.read_csv(file_path, header=None)
-        
-        # Assign default column names
-        if len(df.columns) >= 5:
-            df.columns = ['col0', 'P0', 'P1', 'P2', 'AMBIENT'] + [f'extra{i}' for i in range(len(df.columns)-5)]
-        else:
-            raise ValueError(f"File has unexpected number of columns: {len(df.columns)}")
-        
-        # Check the first column to determine format
-        first_col = df['col0']
+        # Read CSV without headers, skipping type inference and any extra columns
+        df = pd.read_csv(file_path, header=None, usecols=_PPG_USECOLS, dtype=_PPG_DTYPES)
         
-        # If first column contains large values (likely unix timestamps)
-        if first_col.max() > 1000000000:
-            # Find non-zero values
-            non_zero_mask = first_col != 0
-            
-            # Check if non-zero values are large (unix timestamps) or small (delta)
-            non_zero_values = first_col[non_zero_mask].values
-            
-            if len(non_zero_values) > 0 and non_zero_values[0] > 1000000000:  # Likely unix timestamp (seconds since 1970)
-                # Get start and end times from the first and last non-zero values
-                start_time = non_zero_values[0]
-                end_time = non_zero_values[-1]
-
-                # Rename first column
-                df.rename(columns={'col0': 'timestamp'}, inplace=True)
-
-                # Convert to datetime
-                df = full_timestamp_expansion(df, start_time, end_time, column='datetime')
-
-                # Drop the original timestamp column
-                df.drop(['timestamp'], axis=1, inplace=True)
-                
-                return df
+        # Assign default column names; the reader only ever returns the five PPG columns
+        df.columns = _BASE_COLS
         
-        # If max value of first column is relatively small (<= 10000), likely delta format
-        elif first_col.max() <= 10000:
-            # Process as delta format
-            info_file = os.path.join(folder_path or os.path.dirname(file_path), 'info.txt')
-            start_time = None
-            
-            # Read info.txt to get start_time
-            if os.path.exists(info_file):
-                with open(info_file, 'r') as f:
-                    info_content = f.read()
-                    match = re.search(r'start_time:\s*(\d+)', info_content)
-                    if match:
-                        start_time = int(match.group(1))
-            
-            if start_time is None:
-                raise ValueError(f"Cannot find start_time in info.txt file for {file_path}")
-            
-            # Calculate cumulative deltas (in milliseconds)            
-            df.rename(columns={'col0': 'delta'}, inplace=True)
-            df = delta_timestamp_expansion(df, start_time, delta="delta", column='datetime')
-            
-            # Rename and drop temporary columns
-            df.drop(['delta'], axis=1, inplace=True)
-            
-            return df
-        
-        else:
+        # Check the first column to determine the format, then hand over to its reader
+        first_col = df['col0'].to_numpy()
+        reader = _FORMAT_READERS.get(_detect_format(first_col))
+        if reader is None:
             raise ValueError(f"File {file_path} does not match expected formats.")
         
+        return reader(df, first_col, file_path, folder_path)
+        
     except Exception as e:
         raise ValueError(f"Error reading file {file_path}: {str(e)}")
 
 
+def _detect_format(first_col: np.ndarray) -> str | None:
+    """Classify a PPG file by its first column: "timestamp", "delta", or None if it matches neither"""
+    first_max = np.nanmax(first_col)  # Missing cells (NaN) are skipped
+    if first_max > 1000000000:  # Large values, likely unix timestamps
+        return "timestamp"
+    if first_max <= 10000:  # Relatively small values, likely deltas
+        return "delta"
+    return None
+
+
+def _read_timestamp_format(df: pd.DataFrame, first_col: np.ndarray, file_path: str, folder_path: str) -> pd.DataFrame:
+    """Timestamp format: batches of rows where only the first row of each batch carries a unix timestamp"""
+    # Only the first and last timestamps are needed, which sit near the two ends of the column
+    first, last = _timestamp_bounds(first_col)
+    if first is None or first_col[first] <= 1000000000:
+        raise ValueError(f"File {file_path} does not match expected formats.")
+
+    # Spread the samples evenly between the first and last timestamps
+    start_time = first_col[first]
+    end_time = first_col[last]
+    times_ns = _expand_ns(int(round(start_time * 1_000_000)), (end_time - start_time) * 1_000_000, len(first_col))
+
+    return _ppg_frame(df, times_ns)
+
+
+def _read_delta_format(df: pd.DataFrame, first_col: np.ndarray, file_path: str, folder_path: str) -> pd.DataFrame:
+    """Delta format: millisecond deltas between samples, with the start_time in the folder's info.txt"""
+    info_file = os.path.join(folder_path or os.path.dirname(file_path), 'info.txt')
+    start_time = _read_start_time(info_file)
+    if start_time is None:
+        raise ValueError(f"Cannot find start_time in info.txt file for {file_path}")
+
+    # Spread the samples evenly over the total of the deltas (in milliseconds)
+    times_ns = _expand_ns(np.int64(start_time) * 1_000_000_000, np.nansum(first_col) * 1_000_000, len(first_col))
+
+    return _ppg_frame(df, times_ns)
+
+
+def _timestamp_bounds(a: np.ndarray, block: int = 4096) -> tuple[int | None, int | None]:
+    """
+    Positions of the first and last positive values of an array, or (None, None) if there are none
+
+    Zeros and missing cells (NaN) are skipped. The array is searched block by block from each
+    end, so when the timestamps sit near the ends only a few blocks are read instead of the whole array.
+    """
+    first = None
+    for offset in range(0, len(a), block):
+        idx = np.flatnonzero(a[offset:offset + block] > 0)
+        if len(idx):
+            first = offset + idx[0]
+            break
+    if first is None:
+        return None, None
+
+    for stop in range(len(a), first, -block):
+        idx = np.flatnonzero(a[max(stop - block, first):stop] > 0)
+        if len(idx):
+            return first, max(stop - block, first) + idx[-1]
+    return first, first
+
+
+# Reader of each format recognised by _detect_format
+_FORMAT_READERS = {"timestamp": _read_timestamp_format, "delta": _read_delta_format}
+
+
+def _ppg_frame(df: pd.DataFrame, times_ns: np.ndarray) -> pd.DataFrame:
+    """Assemble the output frame in one go from the parsed sensor columns and int64 ns timestamps"""
+    columns = {name: df[name].to_numpy() for name in _BASE_COLS[1:]}
+    columns['datetime'] = times_ns.view('datetime64[ns]')
+    return pd.DataFrame(columns, copy=False)
+
+
+def _read_start_time(info_file: str) -> int | None:
+    """
+    Get the start_time of an info.txt file, or None if it is missing
+
+    All the files of a folder share its info.txt, so the result is cached per
+    path, modification time and size, and the file is only scanned again once it changes.
+    """
+    try:
+        stat = os.stat(info_file)
+    except OSError:
+        return None
+    return _search_start_time(info_file, (stat.st_mtime_ns, stat.st_size))
+
+
+@functools.lru_cache(maxsize=1024)
+def _search_start_time(info_file: str, stamp: tuple) -> int | None:
+    """Find the start_time in an info.txt file by scanning it memory-mapped, without reading or decoding it"""
+    with open(info_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:  # Empty files cannot be mapped
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as info_content:
+            match = _START_TIME_RE.search(info_content)
+            return int(match.group(1)) if match else None
+
+
+# Only the most recent recording is kept: reprocessing the same file with new settings is what the
+# cache is for, and each multi-hour recording would otherwise stay in memory for the app's lifetime
+@functools.lru_cache(maxsize=1)
+def _read_ppg_file_cached(file_path: str, folder_path: str, stamp: tuple) -> pd.DataFrame:
+    """Parse a PPG file once per stamp; the stamp only serves as part of the cache key"""
+    return read_ppg_file(file_path, folder_path=folder_path)
+
+
+def read_ppg_file_cached(file_path: str, folder_path: str = None) -> pd.DataFrame:
+    """
+    Read PPG data like read_ppg_file, reusing the parsed data while the file is unchanged
+
+    The cache is keyed on the path, modification time and size of the file and of
+    its info.txt, so an edited or replaced file is parsed again.
+
+    Args:
+        file_path (str): Path to the PPG file
+        folder_path (str, optional): Path to the folder containing the file (for info.txt)
+
+    Returns:
+        pd.DataFrame: A copy of the parsed data, which the caller may modify
+    """
+    file_path = os.path.abspath(file_path)
+    info_file = os.path.join(folder_path or os.path.dirname(file_path), 'info.txt')
+
+    stamp = []
+    for path in (file_path, info_file):
+        try:
+            stat = os.stat(path)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append(None)
+
+    return _read_ppg_file_cached(file_path, folder_path, tuple(stamp)).copy()
+
+
 def is_incrementing_sequence(arr: np.ndarray, tolerance: float = 0.1) -> bool:
     """Check if an array is approximately an incrementing sequence"""
     if len(arr) < 2:
         return True
         
-    diffs = np.diff(arr)
-    mean_diff = np.mean(diffs)
+    # Work in one float buffer: the differences, then their absolute deviation from the mean
+    diffs = np.subtract(arr[1:], arr[:-1], dtype=np.float64)
+    mean_diff = diffs.mean()
+    np.subtract(diffs, mean_diff, out=diffs)
+    np.abs(diffs, out=diffs)
     
     # Check if most differences are within tolerance of the mean difference
-    return np.sum(np.abs(diffs - mean_diff) < tolerance * mean_diff) / len(diffs) > 0.9
+    return np.count_nonzero(diffs < tolerance * mean_diff) / len(diffs) > 0.9
+
+
+def _expand_ns(start_ns: int, span_ns: float, n: int) -> np.ndarray:
+    """
+    Spread n timestamps evenly from start_ns over span_ns, as int64 nanoseconds
+
+    Only the offsets from the start go through float64, where they stay exact enough;
+    the absolute start is added as an integer so the epoch part is not rounded.
+    """
+    times_ns = np.linspace(0, span_ns, n).astype(np.int64)
+    times_ns += start_ns
+    return times_ns
 
 
 def delta_timestamp_expansion(
@@ -134,9 +245,9 @@ def delta_timestamp_expansion(
 
     # The total time the epoch lasted can then be divided by the length of the array
     time_accumu = df[delta].sum()
-    time_sample = np.linspace(0, time_accumu, df.shape[0])
+    times_ns = _expand_ns(np.int64(start_time) * 1_000_000_000, time_accumu * 1_000_000, df.shape[0])
 
-    df[column] = pd.to_datetime(start_time * 1000 + time_sample, unit="ms")
+    df[column] = times_ns.view("datetime64[ns]")
 
     return df
 
@@ -169,8 +280,62 @@ def full_timestamp_expansion(
     """
 
     # The total time the epoch lasted can then be divided by the length of the array
-    times = np.linspace(start_time, end_time, df.shape[0])
+    times_ns = _expand_ns(int(round(start_time * 1_000_000)), (end_time - start_time) * 1_000_000, df.shape[0])
+
+    df[column] = times_ns.view("datetime64[ns]")
+
+    return df
+
+
+def write_csv(df: pd.DataFrame, file_path: str) -> None:
+    """
+    Write a DataFrame to a CSV file without its index
+
+    Args:
+        df (pd.DataFrame): DataFrame to write
+        file_path (str): Destination path of the CSV file
+    """
+    with open(file_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        df.to_csv(f, index=False, encoding="utf-8")
+
+
+def iter_subfolders(directory_path: str, numeric_only: bool = False):
+    """
+    Yield the paths of the subfolders of a directory while it is being listed
+
+    Args:
+        directory_path (str): Directory to list
+        numeric_only (bool, optional): Only yield folders with numeric names
+
+    Yields:
+        str: Path of each subfolder, in directory order
+    """
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            # DirEntry caches the file type from the listing, so this needs no extra stat
+            if entry.is_dir() and (not numeric_only or entry.name.isdigit()):
+                yield entry.path
+
+
+def concat_sorted(frames: list, by: str = "Time") -> pd.DataFrame:
+    """
+    Concatenate DataFrames once and stably sort the result by a column
+
+    The frames are expected to be sorted already, so the result is only sorted if
+    it is not monotonic, using a merge sort that runs in near-linear time on the
+    presorted chunks.
+
+    Args:
+        frames (list): DataFrames with the same columns, each sorted by the column
+        by (str, optional): Datetime column to sort by
+
+    Returns:
+        pd.DataFrame: Combined DataFrame with a fresh RangeIndex
+    """
+    combined = pd.concat(frames, ignore_index=True)
 
-    df[column] = pd.to_datetime(times, unit="ms")
+    if not combined[by].is_monotonic_increasing:
+        order = np.argsort(combined[by].to_numpy().view("i8"), kind="stable")
+        combined = combined.take(order).reset_index(drop=True)
 
-    return df
\ No newline at end of file
+    return combined
@@ -0,0 +1,31 @@
+"""
+Shared fixtures: short synthetic PPG recordings
+"""
+
+import neurokit2 as nk
+import numpy as np
+import pytest
+
+SAMPLING_RATE = 50
+HEART_RATE = 70
+START_TIME = 1700000000  # info.txt start_time, unix seconds
+
+
+@pytest.fixture(scope="session")
+def synthetic_ppg():
+    """Two minutes of simulated PPG at 50 Hz and 70 bpm"""
+    return nk.ppg_simulate(duration=120, sampling_rate=SAMPLING_RATE, heart_rate=HEART_RATE, random_state=42)
+
+
+def write_delta_recording(folder, signal):
+    """Write a signal as a delta-format ppg.csv (with its info.txt) in folder and return the csv path"""
+    (folder / "info.txt").write_text(f"start_time: {START_TIME}\n")
+
+    # Raw ADC-like counts: the pulse on a large offset in every channel and a constant ambient level
+    counts = np.round(50000 + 2000 * signal).astype(np.int64)
+    delta = 1000 // SAMPLING_RATE
+    rows = [f"{delta},{c},{c + 10},{c + 20},1000\n" for c in counts]
+
+    ppg_file = folder / "ppg.csv"
+    ppg_file.write_text("".join(rows))
+    return ppg_file
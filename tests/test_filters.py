@@ -0,0 +1,77 @@
+"""
+Tests for the bandpass filter and the sampling rate estimate
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.signal import butter, sosfiltfilt
+
+from ppg_processor.processing.filters import bandpass_filter, estimate_sampling_rate
+
+FS = 50.0
+
+
+def _test_signal(n=3000):
+    t = np.arange(n) / FS
+    pulse = np.sin(2 * np.pi * 1.2 * t)  # In the 0.5-4 Hz pass band
+    drift = 3 * np.sin(2 * np.pi * 0.05 * t)
+    noise = 0.5 * np.sin(2 * np.pi * 12 * t)
+    return t, pulse, pulse + drift + noise
+
+
+def test_zero_phase_matches_sosfiltfilt():
+    _, _, signal = _test_signal()
+    sos = butter(5, [0.5 / (FS / 2), 4.0 / (FS / 2)], btype="bandpass", output="sos")
+
+    np.testing.assert_allclose(bandpass_filter(signal, 0.5, 4.0, FS), sosfiltfilt(sos, signal))
+
+
+@pytest.mark.parametrize("zero_phase", [True, False])
+def test_keeps_pass_band_and_removes_drift_and_noise(zero_phase):
+    _, pulse, signal = _test_signal()
+
+    filtered = bandpass_filter(signal, 0.5, 4.0, FS, order=11, zero_phase=zero_phase)
+
+    # Skip the edges, where the filter settles
+    middle = slice(500, -500)
+    assert np.std(filtered[middle]) == pytest.approx(np.std(pulse[middle]), rel=0.1)
+    if zero_phase:
+        # No phase shift: the pulse comes out where it went in
+        assert np.corrcoef(filtered[middle], pulse[middle])[0, 1] > 0.99
+
+
+def test_single_pass_delays_the_signal():
+    _, pulse, signal = _test_signal()
+
+    filtered = bandpass_filter(signal, 0.5, 4.0, FS, order=11, zero_phase=False)
+
+    # The forward-only filter shifts the pulse later; realigning it restores the correlation
+    middle = slice(500, -500)
+    lags = np.arange(0, 100)
+    correlations = [np.corrcoef(filtered[500 + lag:-500 + lag], pulse[middle])[0, 1] for lag in lags]
+    assert lags[int(np.argmax(correlations))] > 0
+    assert max(correlations) > 0.99
+
+
+@pytest.mark.parametrize("zero_phase", [True, False])
+def test_filters_columns_like_single_channels(zero_phase):
+    _, _, signal = _test_signal()
+    signals = np.column_stack([signal, 2 * signal, -signal])
+
+    filtered = bandpass_filter(signals, 0.5, 4.0, FS, 11, axis=0, zero_phase=zero_phase)
+
+    for i in range(signals.shape[1]):
+        expected = bandpass_filter(signals[:, i], 0.5, 4.0, FS, 11, zero_phase=zero_phase)
+        np.testing.assert_allclose(filtered[:, i], expected, rtol=1e-10, atol=1e-10)
+
+
+def test_estimate_sampling_rate_ignores_gaps():
+    times = pd.date_range("2024-01-01", periods=500, freq="20ms")
+    times = times.append(pd.date_range(times[-1] + pd.Timedelta(minutes=5), periods=500, freq="20ms"))
+
+    assert estimate_sampling_rate(times) == pytest.approx(50.0)
+
+
+def test_estimate_sampling_rate_without_valid_differences():
+    assert estimate_sampling_rate(pd.DatetimeIndex(["2024-01-01"])) is None
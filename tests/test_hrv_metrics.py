@@ -0,0 +1,93 @@
+"""
+Tests for the PPI cleaning and the windowed HRV metrics
+"""
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ppg_processor.processing.hrv_metrics import calculate_hrv_metrics, calculate_metrics, clean_ppi
+
+
+def _reference_bins(times, window):
+    """Bin boundaries of the original row-by-row implementation, as (start, end) positions"""
+    bins = []
+    start = 0
+    for i in range(1, len(times)):
+        new_window = times[i] - times[start] > timedelta(minutes=window)
+        gap = times[i] - times[i - 1] > timedelta(minutes=1)
+        if new_window or gap:
+            bins.append((start, i))
+            start = i
+    bins.append((start, len(times)))
+    return [(start, end) for start, end in bins if end - start > 1]
+
+
+def _ppi_data(seed=0):
+    """Peaks at about 70 bpm with two long gaps and an isolated peak between them"""
+    rng = np.random.default_rng(seed)
+    ppi = rng.normal(857, 40, size=1500)
+    times = pd.Timestamp("2024-01-01 22:00") + pd.to_timedelta(np.cumsum(ppi), unit="ms")
+    times = times.to_numpy()
+    times[600:] += np.timedelta64(3, "m")  # Gap larger than a minute
+    times[601:] += np.timedelta64(3, "m")  # Leaves peak 600 alone between two gaps
+    return pd.DataFrame({"Time": times, "PPI": ppi, "Quality": rng.uniform(0.5, 1, size=len(ppi))})
+
+
+@pytest.mark.parametrize("window", [1, 5])
+def test_bins_match_row_by_row_binning(window):
+    data = _ppi_data()
+
+    hrv = calculate_hrv_metrics(data, window=window)
+
+    times = list(data["Time"])
+    bins = _reference_bins(times, window)
+    assert len(hrv) == len(bins)
+    for row, (start, end) in zip(hrv.itertuples(), bins):
+        assert row.Start_Time == times[start]
+        assert row.End_Time == times[end - 1]
+        assert row.Num_Data_Points == end - start
+
+        expected = calculate_metrics(data["PPI"].to_numpy()[start:end], data["Quality"].to_numpy()[start:end])
+        for name in ("MeanNN", "SDNN", "RMSSD", "SDSD", "MedianNN", "Mean_Quality"):
+            assert getattr(row, name) == pytest.approx(expected[name])
+
+
+def test_no_bins():
+    data = _ppi_data().iloc[:1]
+
+    assert calculate_hrv_metrics(data).empty
+
+
+def test_calculate_metrics():
+    ppi = np.array([800.0, 850.0, 820.0, 900.0])
+
+    metrics = calculate_metrics(ppi, [1.0, 0.5, 0.5, 1.0])
+
+    diffs = np.diff(ppi)
+    assert metrics["MeanNN"] == pytest.approx(842.5)
+    assert metrics["SDNN"] == pytest.approx(np.std(ppi, ddof=1))
+    assert metrics["RMSSD"] == pytest.approx(np.sqrt(np.mean(diffs**2)))
+    assert metrics["SDSD"] == pytest.approx(np.std(diffs, ddof=1))
+    assert metrics["MedianNN"] == pytest.approx(835.0)
+    assert metrics["Mean_Quality"] == pytest.approx(0.75)
+    assert metrics["Num_Data_Points"] == 4
+
+
+def test_calculate_metrics_with_one_interval():
+    metrics = calculate_metrics([800.0], [1.0])
+
+    assert np.isnan(metrics["SDNN"])
+    assert metrics["Num_Data_Points"] == 1
+
+
+def test_clean_ppi():
+    times_ns = np.array([0, 800, 1700, 1900, 2800], dtype=np.int64) * 1_000_000
+
+    keep, ppi = clean_ppi(times_ns, low=667, high=2000)
+
+    # The 200 ms interval is dropped, and positions refer to the peak that ends each interval
+    np.testing.assert_array_equal(keep, [1, 2, 4])
+    np.testing.assert_allclose(ppi, [800, 900, 900])
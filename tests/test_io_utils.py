@@ -0,0 +1,96 @@
+"""
+Tests for reading the PPG CSV formats
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ppg_processor.utils.io_utils import _detect_format, read_ppg_file
+
+START_TIME = 1700000000  # info.txt start_time, unix seconds
+
+
+def _write_delta_recording(folder, rows, start_time=START_TIME):
+    (folder / "info.txt").write_text(f"device: test\nstart_time: {start_time}\n")
+    ppg_file = folder / "ppg.csv"
+    ppg_file.write_text("".join(f"{row}\n" for row in rows))
+    return ppg_file
+
+
+def test_detect_format():
+    assert _detect_format(np.array([0.0, 1700000000000.0, 0.0])) == "timestamp"
+    assert _detect_format(np.array([20.0, 20.0, 21.0])) == "delta"
+    assert _detect_format(np.array([20.0, 50000.0])) is None
+
+
+def test_detect_format_skips_missing_cells():
+    assert _detect_format(np.array([np.nan, 1700000000000.0, 0.0])) == "timestamp"
+    assert _detect_format(np.array([20.0, np.nan, 21.0])) == "delta"
+
+
+def test_read_delta_format(tmp_path):
+    ppg_file = _write_delta_recording(tmp_path, [f"20,{i},{i + 1},{i + 2},{i + 3}" for i in range(6)])
+
+    ppg = read_ppg_file(str(ppg_file))
+
+    assert list(ppg.columns) == ["P0", "P1", "P2", "AMBIENT", "datetime"]
+    assert ppg["P0"].dtype == np.float32
+    start = pd.Timestamp(START_TIME, unit="s")
+    assert ppg["datetime"].iloc[0] == start
+    assert ppg["datetime"].iloc[-1] == start + pd.Timedelta(milliseconds=120)
+    assert ppg["datetime"].is_monotonic_increasing
+
+
+def test_read_delta_format_with_blank_cell(tmp_path):
+    rows = [f"20,{i},{i + 1},{i + 2},{i + 3}" for i in range(6)]
+    rows[3] = ",3,4,5,6"
+    ppg_file = _write_delta_recording(tmp_path, rows)
+
+    ppg = read_ppg_file(str(ppg_file))
+
+    # The missing delta is skipped in the total instead of turning every timestamp into NaT
+    assert not ppg["datetime"].isna().any()
+    assert ppg["datetime"].iloc[-1] == pd.Timestamp(START_TIME, unit="s") + pd.Timedelta(milliseconds=100)
+
+
+def test_read_delta_format_uses_folder_info(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    ppg_file = data_dir / "ppg.csv"
+    ppg_file.write_text("".join(f"10,{i},{i},{i},{i}\n" for i in range(3)))
+    (tmp_path / "info.txt").write_text(f"start_time: {START_TIME}\n")
+
+    ppg = read_ppg_file(str(ppg_file), folder_path=str(tmp_path))
+
+    assert ppg["datetime"].iloc[0] == pd.Timestamp(START_TIME, unit="s")
+
+
+def test_read_delta_format_without_info(tmp_path):
+    ppg_file = tmp_path / "ppg.csv"
+    ppg_file.write_text("20,1,2,3,4\n20,1,2,3,4\n")
+
+    with pytest.raises(ValueError, match="start_time"):
+        read_ppg_file(str(ppg_file))
+
+
+def test_read_timestamp_format_with_blank_cell(tmp_path):
+    start_ms = START_TIME * 1000
+    first_col = [start_ms, 0, 0, "", start_ms + 5000, 0, 0, start_ms + 10000, 0]
+    ppg_file = tmp_path / "ppg.csv"
+    ppg_file.write_text("".join(f"{value},1,2,3,4\n" for value in first_col))
+
+    ppg = read_ppg_file(str(ppg_file))
+
+    # Samples are spread evenly between the first and last timestamps
+    assert not ppg["datetime"].isna().any()
+    assert ppg["datetime"].iloc[0] == pd.Timestamp(start_ms, unit="ms")
+    assert ppg["datetime"].iloc[-1] == pd.Timestamp(start_ms + 10000, unit="ms")
+
+
+def test_read_unknown_format(tmp_path):
+    ppg_file = tmp_path / "ppg.csv"
+    ppg_file.write_text("50000,1,2,3,4\n60000,1,2,3,4\n")
+
+    with pytest.raises(ValueError, match="does not match expected formats"):
+        read_ppg_file(str(ppg_file))
@@ -0,0 +1,24 @@
+"""
+Tests for peak detection on synthetic PPG
+"""
+
+import numpy as np
+
+from conftest import HEART_RATE, SAMPLING_RATE
+from ppg_processor.processing.filters import bandpass_filter
+from ppg_processor.processing.peaks import detect_ppg_peaks
+
+
+def test_detect_ppg_peaks(synthetic_ppg):
+    signal = bandpass_filter(synthetic_ppg, 0.5, 4.0, SAMPLING_RATE, 11)
+
+    peaks, quality = detect_ppg_peaks(signal, float(SAMPLING_RATE))
+
+    # One quality value per sample and roughly one peak per simulated beat
+    assert len(quality) == len(signal)
+    expected_beats = HEART_RATE * len(signal) / SAMPLING_RATE / 60
+    assert abs(len(peaks) - expected_beats) <= 0.05 * expected_beats
+
+    # The intervals between the peaks match the simulated heart rate
+    ppi_ms = np.diff(peaks) * 1000 / SAMPLING_RATE
+    assert abs(np.median(ppi_ms) - 60000 / HEART_RATE) < 50
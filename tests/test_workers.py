@@ -0,0 +1,55 @@
+"""
+Smoke tests that run the processing workers on a short synthetic recording
+"""
+
+import numpy as np
+
+from conftest import HEART_RATE, write_delta_recording
+from ppg_processor.processing.directory_worker import DirectoryProcessingWorker
+from ppg_processor.processing.file_worker import PPGProcessingWorker
+
+
+def _run(worker):
+    """Run a worker synchronously and collect what it emits"""
+    results, errors = [], []
+    worker.finished_with_result.connect(results.append)
+    worker.error.connect(errors.append)
+    worker.run()
+    return results, errors
+
+
+def _check_channel(result_dict):
+    ppi_data = result_dict["ppi_data"]
+    assert not ppi_data.empty
+    assert abs(np.median(ppi_data["PPI"]) - 60000 / HEART_RATE) < 50
+    assert ppi_data["Time"].is_monotonic_increasing
+
+    hrv_metrics = result_dict["hrv_metrics"]
+    assert hrv_metrics is not None and not hrv_metrics.empty
+    assert result_dict["overall_metrics"]["MeanNN"] > 0
+
+
+def test_file_worker(tmp_path, synthetic_ppg):
+    ppg_file = write_delta_recording(tmp_path, synthetic_ppg)
+
+    results, errors = _run(PPGProcessingWorker(file_path=str(ppg_file), window_size=1, channels=("P0", "P1")))
+
+    assert errors == []
+    assert len(results) == 1
+    for channel in ("P0", "P1"):
+        _check_channel(results[0][channel])
+
+
+def test_directory_worker(tmp_path, synthetic_ppg):
+    for name in ("1", "2"):
+        folder = tmp_path / name
+        folder.mkdir()
+        write_delta_recording(folder, synthetic_ppg)
+
+    worker = DirectoryProcessingWorker(directory_path=str(tmp_path), window_size=1, channels=("P0",), max_threads=2)
+    results, errors = _run(worker)
+
+    assert errors == []
+    assert len(results) == 1
+    _check_channel(results[0]["P0"])
+    assert set(results[0]["P0"]["ppi_data"]["Folder"]) == {"1", "2"}